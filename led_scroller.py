@@ -15,20 +15,17 @@ from PIL import ImageFont, ImageDraw, Image
 
 
 import tetris_font
+import tetris_scroll
+import tetris_packed
+import tetris_control
 import tetris_animation
 
 ATARI_FONT = "./AtariST8x16SystemFont.ttf"
 
 SCALE = 8
-SCREEN_W = 128
-SCREEN_H = 64
 
 
-CHARS = ("01234567890"
-         "abcdefghijklmnopqrstuvwxyz"
-         "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-         "\"'`~!@#$%^&*()_+-={}[]:;<>?,<>?,./"
-         "ÄäÖöÜüß")
+CHARS = tetris_font.CHARS
 
 ATARI_DIM = (8, 16)
 BLACK = (0, 0, 0)
@@ -55,47 +52,19 @@ COLORS = [
     ORANGE
 ]
 
+PALETTES = {
+    "rainbow": COLORS,
+    "gray": tetris_animation.GRAY_COLORS,
+    "pastel": tetris_animation.PASTEL_COLORS,
+    "earth": tetris_animation.EARTH_COLORS,
+    "dark_mustard": tetris_animation.DARK_MUSTARD_COLORS,
+}
 
-BASE_OFFSET_Y = 24
-SPEED_X = 16
-SPEED_Y = 2
 
-
-def time_for_char_to_arrive_at_loc(n, loc):
-    return (loc + n) * 8 * SPEED_X
-
-
-def Draw(set_pixel, text, t, font_tab, colors):
-
-    offset_x = 128 - t // SPEED_X
-    for n, c in enumerate(text):
-        if c == " ":
-            continue
-        if offset_x + n * 8 < -8:
-            continue
-        if offset_x + n * 8 > 128:
-            continue
-        patterns = font_tab[c]
-        for num, (ll, piece) in enumerate(patterns):
-            offset_y = (t - time_for_char_to_arrive_at_loc(n, 1)) // SPEED_Y
-            offset_y -= (48 * num)
-            offset_y += len(piece)
-            if offset_x + n * 8 > 32:
-                if offset_y > 0:
-                    offset_y = 0
-            else:
-                offset_y = (
-                    t - time_for_char_to_arrive_at_loc(n, 12)) // SPEED_Y
-
-                offset_y -= (32 * num)
-                if offset_y < 0:
-                    offset_y = 0
-
-            color = colors[num % len(colors)]
-            for pixel in piece:
-                x = n * 8 + ll[0] + pixel[0] + offset_x
-                y = ll[1] + pixel[1] + offset_y + BASE_OFFSET_Y
-                set_pixel((x, y), color)
+# pixels per second
+SPEED_X = 7.5
+SPEED_Y = 60.0
+FPS = 120.0
 
 
 def MakeMatrix(args):
@@ -141,6 +110,15 @@ def main():
     parser.add_argument("--font_size", action="store",  type=int,
                         help="Font Size.",
                         default=16)
+    tetris_font.AddTilingArgs(parser)
+    tetris_packed.AddFontTabArgs(parser)
+    tetris_font.AddSolverArgs(parser)
+    tetris_font.AddProfileArgs(parser)
+    tetris_font.AddCharsetArgs(parser)
+    tetris_scroll.AddMissingArgs(parser)
+    tetris_control.AddControlArgs(parser)
+    tetris_scroll.AddLaneArgs(parser, PALETTES)
+    tetris_scroll.AddSchedulerArgs(parser, FPS, SPEED_X, SPEED_Y)
     #
     parser.add_argument("-r", "--led-rows", action="store",
                         help="Display rows. 16 for 16x32, 32 for 32x32. Default: 32", default=32, type=int)
@@ -182,23 +160,56 @@ def main():
 
     args = parser.parse_args()
     random.seed(66)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO)
 
     matrix = MakeMatrix(args)
-    dim, FONT_TAB = tetris_font.MakeFontTab(
-        args.font_path, args.font_size, CHARS)
+    lane_texts = tetris_scroll.LaneTexts(args.text, args.lane_text, args.lanes)
+    if args.font_tab:
+        FONT_TAB = tetris_packed.PackedFontTab.Load(args.font_tab)
+        dim = FONT_TAB.dim
+    else:
+        dim, FONT_TAB = tetris_font.Profiled(
+            args, tetris_font.MakeFontTab, args.font_path, args.font_size,
+            tetris_font.ParseCharset(args.charset, args.font_path),
+            cache_path=args.cache_path,
+            jobs=args.jobs, options=tetris_font.SolverOptionsFromArgs(args),
+            first="".join(lane_texts))
     canvas = matrix.CreateFrameCanvas()
-    text = args.text
-    t = 0
-    print(canvas.width, canvas.height, text)
-
-    def set_pixel(pos, color):
-        canvas.SetPixel(*pos, *color)
+    # the geometry follows the panel chain, the lanes are stacked vertically
+    screen_w = canvas.width
+    screen_h = canvas.height
+    print(screen_w, screen_h, lane_texts)
+    lanes = tetris_scroll.MakeLanes(FONT_TAB, dim, COLORS,
+                                    tetris_scroll.TicksPerPixel(args.speed_x),
+                                    tetris_scroll.TicksPerPixel(args.speed_y),
+                                    screen_w, screen_h, len(lane_texts),
+                                    args.lines, args.repeat, args.missing)
+    tetris_scroll.ConfigureLanes(lanes, args.lane_speed_x,
+                                 [PALETTES[p] for p in args.lane_palette])
+    for texts, text in zip(lanes, lane_texts):
+        if text:
+            texts.Add(text)
+    control = None
+    if args.control:
+        control = tetris_control.ControlServer(
+            args.control, PALETTES,
+            tetris_control.PrepareText(FONT_TAB, args.missing), len(lanes))
+        control.Start()
+    scheduler = tetris_scroll.SchedulerFromArgs(args)
+
+    fb = tetris_scroll.FrameBuffer(screen_w, screen_h, BLACK)
 
     while True:
-        t += 1
-        canvas.Clear()
-        canvas.Fill(0, 0, 0)
-        Draw(set_pixel, text, t, FONT_TAB, COLORS)
+        t = scheduler.Next()
+        if control:
+            for command in control.Poll():
+                tetris_control.ApplyCommand(lanes, command, PALETTES)
+        fb.Clear()
+        for texts in lanes:
+            texts.Render(fb, t)
+        # the image overwrites the whole canvas, no need to clear it
+        fb.PushToCanvas(canvas)
         canvas = matrix.SwapOnVSync(canvas)
 
 
@@ -13,6 +13,9 @@ from PIL import ImageFont, ImageDraw, Image
 
 
 import tetris_font
+import tetris_scroll
+import tetris_packed
+import tetris_control
 
 
 BLACK = (0, 0, 0, 255)
@@ -76,14 +79,19 @@ DARK_MUSTARD_COLORS = [
     (176, 49, 49, 255),
 ]
 
+PALETTES = {
+    "rainbow": COLORS,
+    "gray": GRAY_COLORS,
+    "pastel": PASTEL_COLORS,
+    "earth": EARTH_COLORS,
+    "dark_mustard": DARK_MUSTARD_COLORS,
+}
 
-BASE_OFFSET_Y = 24
-SPEED_X = 48 * 3
-SPEED_Y = 6 * 3
 
-
-def time_for_char_to_arrive_at_loc(n, loc):
-    return (loc + n) * 8 * SPEED_X
+# pixels per second
+SPEED_X = 7.5
+SPEED_Y = 60.0
+FPS = 60.0
 
 
 SCALE = 8
@@ -91,57 +99,45 @@ SCREEN_W = 128
 SCREEN_H = 64
 
 
-def Draw(set_pixel, text, t, font_tab, font_w, colors):
-    offset_x = 128 - t // SPEED_X
-    for n, c in enumerate(text):
-        if c == " ":
-            continue
-        if offset_x + n * font_w < -font_w:
-            continue
-        if offset_x + n * font_w > 128:
-            continue
-        patterns = font_tab[c]
-        for num, (ll, piece) in enumerate(patterns):
-            color = colors[num % len(colors)]
-            offset_y = (t - time_for_char_to_arrive_at_loc(n, 1)) // SPEED_Y
-            offset_y -= (48 * num)
-            offset_y += len(piece)
-            if offset_x + n * font_w > font_w * 4:
-                if offset_y > 0:
-                    offset_y = 0
-            else:
-                offset_y = (
-                    t - time_for_char_to_arrive_at_loc(n, 12)) // SPEED_Y
-
-                offset_y -= (32 * num)
-                if offset_y < 0:
-                    offset_y = 0
-
-            for pixel in piece:
-                x = n * 8 + ll[0] + pixel[0] + offset_x
-                y = ll[1] + pixel[1] + offset_y + BASE_OFFSET_Y
-                set_pixel((x, y), color)
-
-
-def RenderPyGame(FONT_TAB, font_w, chars):
+def RenderPyGame(FONT_TAB, dim, lane_texts, speed_x=SPEED_X, speed_y=SPEED_Y,
+                 scheduler=None, control=None, repeat=False, missing="error",
+                 screen_w=SCREEN_W, screen_h=SCREEN_H, lines=1,
+                 lane_speed_x=(), lane_colors=()):
+    if scheduler is None:
+        scheduler = tetris_scroll.FrameScheduler(FPS)
+    # keep wide canvases within a window of about 1024 pixels
+    scale = max(1, min(SCALE, 1024 // screen_w))
     pygame.init()
-    screen = pygame.display.set_mode([SCREEN_W * SCALE, SCREEN_H * SCALE])
-    surface = pygame.Surface([SCREEN_W, SCREEN_H])
-
-    def set_pixel(pos, color):
-        surface.set_at(pos, color)
-
-    t = 0
-    while True:
-        t += 1
-        surface.fill(WHITE)
-        Draw(set_pixel, chars, t, FONT_TAB, font_w, GRAY_COLORS)
+    screen = pygame.display.set_mode([screen_w * scale, screen_h * scale])
+    surface = pygame.Surface([screen_w, screen_h])
+
+    fb = tetris_scroll.FrameBuffer(screen_w, screen_h, WHITE)
+    lanes = tetris_scroll.MakeLanes(FONT_TAB, dim, GRAY_COLORS,
+                                    tetris_scroll.TicksPerPixel(speed_x),
+                                    tetris_scroll.TicksPerPixel(speed_y),
+                                    screen_w, screen_h, len(lane_texts),
+                                    lines, repeat, missing)
+    tetris_scroll.ConfigureLanes(lanes, lane_speed_x, lane_colors)
+    for texts, text in zip(lanes, lane_texts):
+        if text:
+            texts.Add(text)
+
+    running = True
+    while running:
+        t = scheduler.Next()
+        if control:
+            for command in control.Poll():
+                tetris_control.ApplyCommand(lanes, command, PALETTES)
+        fb.Clear()
+        for texts in lanes:
+            texts.Render(fb, t)
+        fb.PushToSurface(surface)
         pygame.transform.scale(
-            surface, (SCREEN_W * SCALE, SCREEN_H * SCALE), screen)
+            surface, (screen_w * scale, screen_h * scale), screen)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                break
+                running = False
         pygame.display.flip()
     pygame.quit()
 
@@ -152,11 +148,7 @@ ATARI_SIZE = 16
 AMIGA_FONT = "./amiga4ever.ttf"
 AMIGA_SIZE = 8
 
-CHARS = ("01234567890"
-         "abcdefghijklmnopqrstuvwxyz"
-         "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-         "\"'`~!@#$%^&*()_+-={}[]:;<>?,<>?,./"
-         "ÄäÖöÜüß")
+CHARS = tetris_font.CHARS
 
 
 def main():
@@ -167,17 +159,54 @@ def main():
     parser.add_argument("--font_path", action="store",  type=str,
                         help="Font Path.",
                         default=ATARI_FONT)
+    parser.add_argument("--width", action="store",  type=int,
+                        help="Width of the simulated panel chain.",
+                        default=SCREEN_W)
+    parser.add_argument("--height", action="store",  type=int,
+                        help="Height of the simulated panel chain.",
+                        default=SCREEN_H)
     parser.add_argument("--font_size", action="store",  type=int,
                         help="Font Size.",
                         default=ATARI_SIZE)
+    tetris_font.AddTilingArgs(parser)
+    tetris_packed.AddFontTabArgs(parser)
+    tetris_font.AddSolverArgs(parser)
+    tetris_font.AddProfileArgs(parser)
+    tetris_font.AddCharsetArgs(parser)
+    tetris_scroll.AddMissingArgs(parser)
+    tetris_control.AddControlArgs(parser)
+    tetris_scroll.AddLaneArgs(parser, PALETTES)
+    tetris_scroll.AddSchedulerArgs(parser, FPS, SPEED_X, SPEED_Y)
 
     random.seed(66)
     args = parser.parse_args()
-    dim, font_tab = tetris_font.MakeFontTab(
-        args.font_path, args.font_size, CHARS * 10)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO)
+    lane_texts = tetris_scroll.LaneTexts(args.scroll_text, args.lane_text,
+                                         args.lanes)
+    if args.font_tab:
+        font_tab = tetris_packed.PackedFontTab.Load(args.font_tab)
+        dim = font_tab.dim
+    else:
+        dim, font_tab = tetris_font.Profiled(
+            args, tetris_font.MakeFontTab, args.font_path, args.font_size,
+            tetris_font.ParseCharset(args.charset, args.font_path),
+            cache_path=args.cache_path, jobs=args.jobs,
+            options=tetris_font.SolverOptionsFromArgs(args),
+            first="".join(lane_texts))
     #dim, font_tab = tetris_font.MakeFontTab(AMIGA_FONT, AMIGA_SIZE, CHARS * 10)
 
-    RenderPyGame(font_tab, dim[0], args.scroll_text)
+    control = None
+    if args.control:
+        control = tetris_control.ControlServer(
+            args.control, PALETTES, tetris_control.PrepareText(font_tab, args.missing),
+            len(lane_texts))
+        control.Start()
+    RenderPyGame(font_tab, dim, lane_texts, args.speed_x,
+                 args.speed_y, tetris_scroll.SchedulerFromArgs(args), control,
+                 args.repeat, args.missing, args.width, args.height,
+                 args.lines, args.lane_speed_x,
+                 [PALETTES[p] for p in args.lane_palette])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+"""
+Tiles every font of a directory at several sizes ahead of time
+
+Each (font, size) combination is tiled in a worker process. The tilings
+end up in the tiling cache (see TilingCache), so the scrollers find them
+there instead of solving on the device. Optionally every combination is
+also written as a packed font tab (see tetris_packed.py).
+
+Finished combinations are appended to a progress file (JSON lines) and
+skipped when the batch is run again, so an interrupted batch resumes
+where it stopped. The cache and the progress file are written every
+SAVE_EVERY combinations and at the end. The progress file doubles as the report: per
+combination whether every glyph is tileable, the tiling time and the
+solver counters.
+
+./tetris_batch.py --sizes 8,16 --jobs 0 ./fonts
+./tetris_batch.py --charset default,00A0-017F --packed_dir ./tabs ./fonts
+"""
+import concurrent.futures
+import json
+import logging
+import os
+import time
+
+# keep the output readable (tetris_font imports pygame)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import tetris_font
+import tetris_packed
+
+FONT_SUFFIXES = (".ttf", ".otf")
+DEFAULT_PROGRESS_PATH = "tetris_batch.jsonl"
+# finished combinations after which the cache and the progress are saved
+SAVE_EVERY = 16
+
+
+def FindFonts(font_dir):
+    """The font files below font_dir, sorted"""
+    out = []
+    for root, _, files in os.walk(font_dir):
+        out += [os.path.join(root, f) for f in files
+                if f.lower().endswith(FONT_SUFFIXES)]
+    return sorted(out)
+
+
+def ParseSizes(spec):
+    return sorted({int(s) for s in spec.split(",") if s.strip()})
+
+
+def LoadProgress(path):
+    """Returns the reports of the finished combinations keyed by "key" """
+    out = {}
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            for line in fp:
+                # a line cut short by an interrupted run is redone
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    continue
+                out[report["key"]] = report
+    except FileNotFoundError:
+        pass
+    return out
+
+
+def QuietWorker():
+    """Pool initializer: the per glyph solver logs would drown the report"""
+    logging.getLogger().setLevel(logging.ERROR)
+
+
+def TileFont(font_path, font_size, chars, todo, seed, options):
+    """Tiles todo (a subset of chars) of one font size in a worker
+
+    Returns (dim, font tab of todo, FontTabStats totals, untileable
+    glyphs). dim covers all of chars like MakeFontTab's.
+    """
+    stats = tetris_font.FontTabStats()
+    start = time.monotonic()
+    tiler = tetris_font.GlyphTiler(font_path, font_size, chars, seed, None, 1,
+                                   options, stats)
+    font_tab = tiler.Tile(todo)
+    stats.seconds = time.monotonic() - start
+    untileable = "".join(c for c in font_tab if stats.glyphs[c].fillers)
+    return tiler.dim, font_tab, stats.Totals(), untileable
+
+
+class Batch:
+    """Merges the worker results into the cache, the packed font tabs and
+    the progress file"""
+
+    def __init__(self, cache_path, progress_path, packed_dir, seed, options):
+        self._cache = tetris_font.TilingCache(cache_path) if cache_path \
+            else None
+        self._progress_path = progress_path
+        self._packed_dir = packed_dir
+        self._seed = seed
+        self._options = options
+        self.done = LoadProgress(progress_path)
+        # reports of the combinations finished since the last Save()
+        self._unsaved = []
+
+    def Key(self, digest, font_size, charset) -> str:
+        return (f"{digest}:{font_size}:{self._seed}:"
+                f"{self._options.Variant()}:{charset}")
+
+    def _CacheKey(self, digest, font_size, c):
+        return tetris_font.TilingCache.Key(digest, font_size, self._seed,
+                                           self._options.Variant(), c)
+
+    def Cached(self, digest, font_size, chars):
+        """The glyph -> tiling map of the glyphs of chars in the cache"""
+        out = {}
+        if self._cache:
+            for c in chars:
+                patterns = self._cache.get(self._CacheKey(digest, font_size, c))
+                if patterns is not None:
+                    out[c] = patterns
+        return out
+
+    def Finish(self, job, result):
+        """Stores the result of a job, returns its report"""
+        font_path, digest, font_size, charset, cached = job
+        dim, font_tab, totals, untileable = result
+        if self._cache:
+            for c, patterns in font_tab.items():
+                # best effort tilings are recomputed next time
+                if c not in untileable:
+                    self._cache.put(self._CacheKey(digest, font_size, c),
+                                    patterns)
+        if self._packed_dir:
+            os.makedirs(self._packed_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(font_path))[0]
+            tetris_packed.PackedFontTab.Pack({**cached, **font_tab}, dim).Save(
+                os.path.join(self._packed_dir, f"{name}-{font_size}.tft"))
+        report = {"key": self.Key(digest, font_size, charset),
+                  "font": font_path,
+                  "size": font_size,
+                  "dim": dim,
+                  "glyphs": len(font_tab) + len(cached),
+                  "cached": len(cached),
+                  "tileable": not untileable,
+                  "untileable": untileable}
+        report.update((k, totals[k]) for k in (
+            "seconds", "solve_seconds", "nodes", "attempts", "cheats",
+            "fillers"))
+        self.done[report["key"]] = report
+        self._unsaved.append(report)
+        if len(self._unsaved) >= SAVE_EVERY:
+            self.Save()
+        return report
+
+    def Save(self):
+        """Saves the cache, then records the combinations it now holds
+
+        An interrupted batch loses at most the combinations finished since
+        the last save and those in flight.
+        """
+        if not self._unsaved:
+            return
+        if self._cache:
+            self._cache.save()
+        with open(self._progress_path, "a", encoding="utf-8") as fp:
+            for report in self._unsaved:
+                fp.write(json.dumps(report) + "\n")
+        self._unsaved = []
+
+
+def Describe(report):
+    w, h = report["dim"]
+    return (f"{report['font']} {report['size']:3d}pt {w}x{h} "
+            f"{report['glyphs']} glyphs ({report['cached']} cached) "
+            f"{report['seconds']:.1f}s {report['cheats']} cheats " +
+            ("tileable" if report["tileable"] else
+             f"NOT tileable: {report['untileable']}"))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", action="store",  type=str,
+                        help="Comma separated font sizes.",
+                        default="16")
+    tetris_font.AddCharsetArgs(parser)
+    parser.add_argument("--seed", action="store",  type=int,
+                        help="Seed for the piece order of the tiling search.",
+                        default=tetris_font.DEFAULT_SEED)
+    parser.add_argument("--cache_path", action="store",  type=str,
+                        help="Tiling cache directory to fill (empty string "
+                        "disables).",
+                        default=tetris_font.DEFAULT_CACHE_PATH)
+    parser.add_argument("--packed_dir", action="store",  type=str,
+                        help="Also write a packed font tab per font and size "
+                        "into this directory.",
+                        default=None)
+    parser.add_argument("--progress", action="store",  type=str,
+                        help="Progress file, finished combinations are "
+                        "skipped.",
+                        default=DEFAULT_PROGRESS_PATH)
+    parser.add_argument("--jobs", action="store",  type=int,
+                        help="Worker processes (0 = all cores).",
+                        default=0)
+    tetris_font.AddSolverArgs(parser)
+    parser.add_argument("font_dir", help="Directory with the fonts.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    options = tetris_font.SolverOptionsFromArgs(args)
+    batch = Batch(args.cache_path, args.progress, args.packed_dir, args.seed,
+                  options)
+    fonts = FindFonts(args.font_dir)
+    sizes = ParseSizes(args.sizes)
+    jobs = []
+    skipped = 0
+    for font_path in fonts:
+        digest = tetris_font.FontDigest(font_path)
+        try:
+            chars = tetris_font.ParseCharset(args.charset, font_path)
+        except ValueError as err:
+            logging.error(f"{font_path}: {err}")
+            continue
+        for font_size in sizes:
+            if batch.Key(digest, font_size, args.charset) in batch.done:
+                skipped += 1
+                continue
+            cached = batch.Cached(digest, font_size, chars)
+            jobs.append((font_path, digest, font_size, args.charset, cached,
+                         chars))
+    logging.info(f"{len(fonts)} fonts, {len(sizes)} sizes: {len(jobs)} to do, "
+                 f"{skipped} done before")
+
+    start = time.monotonic()
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.jobs or None, initializer=QuietWorker) as pool:
+        futures = {}
+        for font_path, digest, font_size, charset, cached, chars in jobs:
+            todo = [c for c in chars if c not in cached]
+            future = pool.submit(TileFont, font_path, font_size, chars, todo,
+                                 args.seed, options)
+            futures[future] = (font_path, digest, font_size, charset, cached)
+        try:
+            for n, future in enumerate(
+                    concurrent.futures.as_completed(futures), 1):
+                job = futures[future]
+                try:
+                    report = batch.Finish(job, future.result())
+                except Exception as err:
+                    # e.g. a font PIL cannot open, it is retried next time
+                    logging.error(f"{job[0]} {job[2]}pt: {err}")
+                    failed += 1
+                    continue
+                print(f"[{n}/{len(jobs)}] {Describe(report)}", flush=True)
+        finally:
+            # also keeps what is finished when the batch is interrupted
+            batch.Save()
+
+    reports = list(batch.done.values())
+    logging.info(f"{len(jobs) - failed} combinations tiled in "
+                 f"{time.monotonic() - start:.1f}s, {failed} failed, "
+                 f"{sum(not r['tileable'] for r in reports)} of "
+                 f"{len(reports)} not tileable")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/python3
+"""
+Benchmarks for the tetris tiling solver and the frame rendering
+
+By default the glyphs are synthetic (made of 2 pixel wide strokes drawn
+with a fixed seed) so no font file is needed and the numbers are
+comparable across machines and commits.
+
+./tetris_bench.py --json bench.json
+./tetris_bench.py --font_path ./AtariST8x16SystemFont.ttf --font_size 16 --engines
+"""
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import ImageFont
+
+# keep stdout clean for --json - (tetris_font imports pygame)
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import tetris_font
+import tetris_scroll
+
+BENCH_SCREEN = (128, 64)
+BENCH_SPEED = (16, 2)
+BENCH_COLORS = [(255, 0, 0), (0, 255, 0), (48, 73, 255), (255, 255, 0)]
+# the dimensions of the Atari font
+SYNTHETIC_DIM = (8, 16)
+
+
+def RenderGlyphs(font_path, font_size, chars):
+    """Returns (w, h) and a glyph -> (h, w) bool ink mask map"""
+    font = ImageFont.truetype(font_path, font_size)
+    chars = list(dict.fromkeys(chars))
+    w = max(font.getbbox(c)[2] for c in chars)
+    h = max(font.getbbox(c)[3] for c in chars)
+    grays = tetris_font.RenderAtlas(font, chars, w, h)
+    return (w, h), {c: gray == 0 for c, gray in zip(chars, grays)}
+
+
+def SyntheticGlyphs(count, seed, dim=SYNTHETIC_DIM):
+    """Returns dim and a glyph -> (h, w) bool mask map of made up glyphs
+
+    Every glyph is the union of 2 to 4 horizontal or vertical strokes that
+    are 2 pixels wide, much like the glyphs of 8x16 bitmap fonts.
+    """
+    w, h = dim
+    rng = random.Random(f"synthetic:{seed}")
+    out = {}
+    for i in range(count):
+        mask = np.zeros((h, w), dtype=bool)
+        for _ in range(rng.randint(2, 4)):
+            if rng.random() < 0.5:
+                y = rng.randrange(2, h - 4)
+                x0 = rng.randrange(0, w - 4)
+                x1 = rng.randrange(x0 + 4, w + 1)
+                mask[y:y + 2, x0:x1] = True
+            else:
+                x = rng.randrange(0, w - 2)
+                y0 = rng.randrange(2, h - 6)
+                y1 = rng.randrange(y0 + 4, h - 1)
+                mask[y0:y1, x:x + 2] = True
+        out[chr(ord("!") + i)] = mask
+    return dim, out
+
+
+def Summary(values):
+    values = sorted(values)
+    if not values:
+        return {"total": 0, "mean": 0, "p50": 0, "max": 0}
+    return {"total": sum(values),
+            "mean": sum(values) / len(values),
+            "p50": values[len(values) // 2],
+            "max": values[-1]}
+
+
+def PeakMemory(func):
+    """Runs func, returns its result and the peak Python heap use in bytes"""
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def TimeEngine(engine, dim, glyphs, seed, repeat, prune=True,
+               order=tetris_font.DEFAULT_ORDER):
+    """Returns the best of `repeat` wall clock times for tiling all glyphs
+    and the number of search nodes expanded
+
+    Unsolvable glyphs are timed until the search space is exhausted.
+    """
+    w, h = dim
+    best = None
+    for _ in range(repeat):
+        stats = tetris_font.SolveStats()
+        start = time.perf_counter()
+        for c, points in glyphs.items():
+            covering = tetris_font.ENGINES[engine](points, w, h)
+            rng = random.Random(f"{seed}:{c}")
+            next(tetris_font.FindCover(covering, 20, rng=rng, prune=prune,
+                                       stats=stats, order=order), None)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, stats.nodes
+
+
+def BenchEngines(dim, masks, seed, repeat, log,
+                 order=tetris_font.DEFAULT_ORDER):
+    glyphs = {c: tetris_font.MaskPoints(mask) for c, mask in masks.items()}
+    results = {}
+    for engine in sorted(tetris_font.ENGINES):
+        for prune in (False, True):
+            elapsed, nodes = TimeEngine(engine, dim, glyphs, seed, repeat,
+                                        prune, order)
+            results[f"{engine}/prune={prune:d}"] = {"seconds": elapsed,
+                                                    "nodes": nodes}
+            log(f"{engine:6} prune={prune:d} {elapsed * 1000:10.1f} ms "
+                f"{nodes:10d} nodes ({len(glyphs)} glyphs)")
+    return results
+
+
+def BenchSolver(dim, masks, seed, options, log):
+    """Solves every glyph on its own and reports the per glyph counters"""
+    w, h = dim
+    per_glyph = []
+    for c, mask in masks.items():
+        points = tetris_font.MaskPoints(mask)
+        stats = tetris_font.SolveStats()
+        tetris_font.SolveGlyph(points, w, h, f"{seed}:{c}", options, stats)
+        per_glyph.append({"glyph": c,
+                          "pixels": len(points),
+                          "nodes": stats.nodes,
+                          "pruned": stats.pruned,
+                          "attempts": stats.attempts,
+                          "cheats": stats.cheats,
+                          "fillers": stats.fillers,
+                          "seconds": stats.seconds})
+    nodes = Summary([g["nodes"] for g in per_glyph])
+    seconds = Summary([g["seconds"] for g in per_glyph])
+    log(f"solver  {len(per_glyph)} glyphs {nodes['total']} nodes "
+        f"{seconds['total'] * 1000:.1f} ms (p50 {seconds['p50'] * 1000:.2f} "
+        f"max {seconds['max'] * 1000:.2f} ms per glyph) "
+        f"{sum(g['fillers'] > 0 for g in per_glyph)} with fillers")
+    return {"nodes": nodes, "seconds": seconds, "glyphs": per_glyph}
+
+
+def BenchFontTab(dim, masks, seed, jobs, options, log):
+    """Times TileGlyphs, i.e. MakeFontTab without rendering and caching"""
+    w, h = dim
+    start = time.perf_counter()
+    font_tab = tetris_font.TileGlyphs(masks, w, h, seed, jobs, options)
+    elapsed = time.perf_counter() - start
+    # tracemalloc slows things down, measure memory in a separate run
+    _, peak = PeakMemory(
+        lambda: tetris_font.TileGlyphs(masks, w, h, seed, 1, options))
+    log(f"font tab {elapsed * 1000:10.1f} ms  peak heap {peak / 1024:.0f} KiB")
+    return font_tab, {"seconds": elapsed, "jobs": jobs, "peak_bytes": peak}
+
+
+def BenchFrames(font_tab, font_w, text, frames, log):
+    """Reports the average per frame render time in microseconds
+
+    "set_pixel" pushes every pixel through a pygame set_at callback,
+    "buffer" renders into a FrameBuffer and blits it with one call,
+    "buffer+image" additionally converts the frame into the PIL image
+    handed to rgbmatrix' SetImage.
+    """
+    import pygame
+    w, h = BENCH_SCREEN
+    anim = tetris_scroll.CompiledText(text, font_tab, font_w, BENCH_COLORS,
+                                      *BENCH_SPEED, w, h, 24)
+    surface = pygame.Surface([w, h])
+    fb = tetris_scroll.FrameBuffer(w, h)
+    # spread the sampled frames over the whole scroll
+    end = anim.Duration()
+    times = [t * end // frames for t in range(frames)]
+
+    def set_pixel(pos, color):
+        surface.set_at(pos, color)
+
+    def render_set_pixel(t):
+        surface.fill((0, 0, 0))
+        anim.Draw(set_pixel, t)
+
+    def render_buffer(t):
+        fb.Clear()
+        anim.Render(fb, t)
+        fb.PushToSurface(surface)
+
+    def render_image(t):
+        fb.Clear()
+        anim.Render(fb, t)
+        fb.ToImage()
+
+    results = {}
+    for name, render in [("set_pixel", render_set_pixel),
+                         ("buffer", render_buffer),
+                         ("buffer+image", render_image)]:
+        start = time.perf_counter()
+        for t in times:
+            render(t)
+        us = (time.perf_counter() - start) / frames * 1e6
+        _, peak = PeakMemory(lambda: [render(t) for t in times[::10]])
+        results[name] = {"us_per_frame": us, "peak_bytes": peak}
+        log(f"{name:12} {us:10.1f} us/frame  peak heap {peak / 1024:.0f} KiB")
+    return results
+
+
+def GitCommit():
+    """The commit of the checkout this file is in, not of the cwd"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], check=True,
+                              capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--font_path", action="store",  type=str,
+                        help="Font Path (default: synthetic glyphs).",
+                        default=None)
+    parser.add_argument("--font_size", action="store",  type=int,
+                        help="Font Size.",
+                        default=16)
+    parser.add_argument("--chars", action="store",  type=str,
+                        help="Glyphs to tile when using a font.",
+                        default=tetris_font.CHARS)
+    parser.add_argument("--glyphs", action="store",  type=int,
+                        help="Number of synthetic glyphs.",
+                        default=64)
+    parser.add_argument("--seed", action="store",  type=int,
+                        help="Seed for the glyphs and the tiling search.",
+                        default=tetris_font.DEFAULT_SEED)
+    parser.add_argument("--jobs", action="store",  type=int,
+                        help="Worker processes for the font tab benchmark.",
+                        default=1)
+    tetris_font.AddSolverArgs(parser)
+    parser.add_argument("--engines", action="store_true",
+                        help="Also compare the engines with and without "
+                        "pruning.")
+    parser.add_argument("--repeat", action="store",  type=int,
+                        help="Engine comparison: best of this many runs.",
+                        default=3)
+    parser.add_argument("--frames", action="store",  type=int,
+                        help="Frames rendered by the frame benchmark.",
+                        default=2000)
+    parser.add_argument("--skip_solver", action="store_true",
+                        help="Only run the frame rendering benchmark.")
+    parser.add_argument("--json", action="store",  type=str,
+                        help="Write the results as JSON to this file "
+                        "('-' for stdout).",
+                        default=None)
+    args = parser.parse_args()
+    out = sys.stderr if args.json == "-" else sys.stdout
+
+    def log(msg):
+        print(msg, file=out)
+
+    options = tetris_font.SolverOptionsFromArgs(args)
+    if args.font_path:
+        dim, masks = RenderGlyphs(args.font_path, args.font_size, args.chars)
+        source = f"{args.font_path}:{args.font_size}"
+    else:
+        dim, masks = SyntheticGlyphs(args.glyphs, args.seed)
+        source = "synthetic"
+
+    results = {"meta": {"commit": GitCommit(),
+                        "python": platform.python_version(),
+                        "machine": platform.machine(),
+                        "platform": platform.platform(),
+                        "glyph_source": source,
+                        "glyphs": len(masks),
+                        "dim": dim,
+                        "seed": args.seed,
+                        "engine": options.engine,
+                        "solver": options.Variant()}}
+    if args.engines and not args.skip_solver:
+        results["engines"] = BenchEngines(dim, masks, args.seed, args.repeat,
+                                          log, options.order)
+    if not args.skip_solver:
+        results["solver"] = BenchSolver(dim, masks, args.seed, options, log)
+    if args.skip_solver:
+        # the frames still need a font tab, tiled once and not timed
+        font_tab = tetris_font.TileGlyphs(masks, *dim, args.seed, args.jobs,
+                                          options)
+    else:
+        font_tab, results["font_tab"] = BenchFontTab(dim, masks, args.seed,
+                                                     args.jobs, options, log)
+    # groups of five glyphs so that the text has spaces
+    glyphs = "".join(font_tab)
+    text = " ".join(glyphs[i:i + 5] for i in range(0, len(glyphs), 5))
+    results["frames"] = BenchFrames(font_tab, dim[0], text, args.frames, log)
+    # ru_maxrss is in KiB on Linux
+    results["max_rss_bytes"] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss * 1024
+    log(f"max rss {results['max_rss_bytes'] / 1024 / 1024:.1f} MiB")
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=1)
+        print()
+    elif args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=1)
+
+
+if __name__ == '__main__':
+    main()
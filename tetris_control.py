@@ -0,0 +1,255 @@
+#!/usr/bin/python3
+"""
+Control channel for a running scroller
+
+A scroller started with --control PATH listens on a Unix socket for
+commands, one per line:
+
+text <message>      queue a message ("\\n" starts a new row)
+clear               drop the queued messages
+speed_x <px/s>      scroll speed of the following messages
+speed_y <px/s>      falling speed of the following messages
+palette <name>      piece colors
+
+With several lanes (--lanes) a command can be prefixed with "lane <n>" to
+address a single lane. Otherwise text goes to the first lane and the other
+commands apply to all lanes.
+
+Every command is answered with "ok" or "error: <reason>".
+
+./tetris_control.py --control /tmp/tetris_scroller.sock text Hello again
+echo "palette pastel" | nc -U /tmp/tetris_scroller.sock
+"""
+import asyncio
+import logging
+import math
+import os
+import queue
+import socket
+import stat
+import threading
+
+from typing import List
+
+import tetris_scroll
+
+DEFAULT_CONTROL_PATH = "/tmp/tetris_scroller.sock"
+
+# command -> argument type (None: no argument)
+COMMANDS = {
+    "text": str,
+    "clear": None,
+    "speed_x": float,
+    "speed_y": float,
+    "palette": str,
+}
+
+
+def ParseCommand(line, palettes, num_lanes=1):
+    """Returns (command, argument, lane) for a line, raises ValueError if
+    invalid
+
+    lane is None unless the command was prefixed with "lane <n>". Speeds
+    are returned in ticks per pixel (see TicksPerPixel).
+    """
+    lane = None
+    name, _, arg = line.strip().partition(" ")
+    if name == "lane":
+        number, _, line = arg.partition(" ")
+        lane = int(number)
+        if not 0 <= lane < num_lanes:
+            raise ValueError(f"lane must be between 0 and {num_lanes - 1}")
+        name, _, arg = line.strip().partition(" ")
+    if name not in COMMANDS:
+        raise ValueError(f"unknown command [{name}]")
+    kind = COMMANDS[name]
+    if kind is None:
+        return name, None, lane
+    if not arg:
+        raise ValueError(f"{name} needs an argument")
+    value = kind(arg)
+    if name == "text":
+        value = value.replace("\\n", "\n")
+    if kind is float:
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f"{name} must be a positive number")
+        # converted here so that a speed without a tick count is rejected
+        # instead of failing in the render loop
+        try:
+            value = tetris_scroll.TicksPerPixel(value)
+        except (OverflowError, ValueError):
+            raise ValueError(f"{name} is out of range")
+    if name == "palette" and value not in palettes:
+        raise ValueError(f"unknown palette [{value}], "
+                         f"one of {', '.join(sorted(palettes))}")
+    return name, value, lane
+
+
+def RemoveStaleSocket(path):
+    """Removes the socket a previous run left behind at path
+
+    Raises FileExistsError if path is not a socket or another process
+    still accepts connections on it.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise FileExistsError(f"another scroller is listening on {path}")
+
+
+class ControlServer:
+    """Serves the control socket from an asyncio loop in a daemon thread
+
+    Commands are handed to the render loop through a thread safe queue, so
+    Poll() never blocks. prepare(text) runs in an executor thread before a
+    message is queued, e.g. to tile missing glyphs off the render loop.
+    """
+
+    def __init__(self, path, palettes, prepare=None, num_lanes=1):
+        self._path = path
+        self._palettes = palettes
+        self._num_lanes = num_lanes
+        self._prepare = prepare
+        self._commands = queue.SimpleQueue()
+        self._loop = None
+        self._stop = None
+        self._thread = None
+        # set if the socket cannot be bound
+        self._error = None
+
+    def Start(self):
+        RemoveStaleSocket(self._path)
+        ready = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run,
+                                        args=(self._Serve(ready),),
+                                        name="control", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def Stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join()
+
+    def Poll(self):
+        """Returns the commands received since the last call"""
+        out = []
+        while True:
+            try:
+                out.append(self._commands.get_nowait())
+            except queue.Empty:
+                return out
+
+    async def _Serve(self, ready):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            server = await asyncio.start_unix_server(self._Handle, self._path)
+        except OSError as err:
+            self._error = err
+            ready.set()
+            return
+        logging.info(f"listening for commands on {self._path}")
+        ready.set()
+        async with server:
+            await self._stop.wait()
+        os.unlink(self._path)
+
+    async def _Handle(self, reader, writer):
+        try:
+            async for line in reader:
+                line = line.decode("utf-8", "replace").strip()
+                if not line:
+                    continue
+                try:
+                    command = ParseCommand(line, self._palettes,
+                                           self._num_lanes)
+                    if command[0] == "text" and self._prepare:
+                        await self._loop.run_in_executor(
+                            None, self._prepare, command[1])
+                    self._commands.put(command)
+                    writer.write(b"ok\n")
+                except ValueError as err:
+                    writer.write(f"error: {err}\n".encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def ApplyCommand(lanes: List[tetris_scroll.TextQueue], command, palettes):
+    name, value, lane = command
+    logging.info(f"command {name} {value if value is not None else ''}"
+                 f"{'' if lane is None else f' lane={lane}'}")
+    if lane is not None:
+        lanes = lanes[lane:lane + 1]
+    elif name == "text":
+        lanes = lanes[:1]
+    for texts in lanes:
+        if name == "text":
+            texts.Add(value)
+        elif name == "clear":
+            texts.Clear()
+        elif name == "speed_x":
+            texts.SetSpeed(speed_x=value)
+        elif name == "speed_y":
+            texts.SetSpeed(speed_y=value)
+        elif name == "palette":
+            texts.SetColors(palettes[value])
+
+
+def PrepareText(font_tab, missing="error"):
+    """Returns a prepare callback that tiles the glyphs of a message
+
+    With the "error" missing glyph policy messages with characters the
+    font tab has no glyph for are rejected.
+    """
+    def prepare(text):
+        for c in text.replace("\n", ""):
+            try:
+                tetris_scroll.LookupGlyph(font_tab, c, missing)
+            except KeyError:
+                raise ValueError(f"no glyph for [{c}]")
+    return prepare
+
+
+def AddControlArgs(parser):
+    parser.add_argument("--control", action="store",  type=str,
+                        help="Accept commands on this Unix socket "
+                        f"(e.g. {DEFAULT_CONTROL_PATH}).",
+                        default=None)
+    parser.add_argument("--repeat", action="store_true",
+                        help="Scroll the last message again while no new "
+                        "one is queued.")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--control", action="store",  type=str,
+                        help="Socket of the running scroller.",
+                        default=DEFAULT_CONTROL_PATH)
+    parser.add_argument("command", nargs="+",
+                        help="Command and argument, e.g. text Hello World")
+    args = parser.parse_args()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(args.control)
+        sock.sendall((" ".join(args.command) + "\n").encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        print(sock.makefile("r", encoding="utf-8").read(), end="")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,36 +9,55 @@ https://int10h.org/oldschool-pc-fonts/fontlist/?2#kaypro
 ./tetris_font.py ./AtariST8x16SystemFont.ttf 16  "@"
 """
 import logging
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import unicodedata
 
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Set, Tuple, Optional
 
 from pygame.locals import *
 import random
-import functools
+import collections
+import concurrent.futures
+import multiprocessing
 
+import numpy as np
 from PIL import ImageFont, ImageDraw, Image
 
 BLACK = (0, 0, 0, 255)
 WHITE = (255, 255, 255, 255)
 
+CHARS = ("01234567890"
+         "abcdefghijklmnopqrstuvwxyz"
+         "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+         "\"'`~!@#$%^&*()_+-={}[]:;<>?,<>?,./"
+         "ÄäÖöÜüß")
 
-def DumpSurface(surface):
-    lines = []
-    w, h = surface.size
+DEFAULT_SEED = 66
 
-    for y in range(h):
-        line = ""
-        for x in range(w):
 
-            pixel = surface.getpixel((x, y))
-            if pixel[0] == 0:
-                line += "X"
-            elif pixel[0] == 255:
-                line += "."
-            else:
-                line += "o"
-        lines.append(line)
-    return "\n".join(lines)
+def GrayArray(surface):
+    """The first channel of an image as a (h, w) uint8 array"""
+    a = np.asarray(surface)
+    if a.ndim == 3:
+        a = a[:, :, 0]
+    return a
+
+
+def DumpGray(gray) -> str:
+    art = np.full(gray.shape, "o")
+    art[gray == 0] = "X"
+    art[gray == 255] = "."
+    return "\n".join("".join(row) for row in art)
+
+
+def DumpSurface(surface):
+    return DumpGray(GrayArray(surface))
 
 
 TETRIS_PIECES = [
@@ -112,6 +131,12 @@ class Covering:
         assert self._num_empty + 1 == self._bitmap.count(EMPTY)
         return self._num_empty
 
+    def is_empty(self, p: POINT) -> bool:
+        x, y = p
+        if x < 0 or x >= self._w or y < 0 or y >= self._h:
+            return False
+        return self._bitmap[x + y * self._w] == EMPTY
+
     def lowest_left(self) -> Optional[POINT]:
         p = self._bitmap.index(EMPTY)
         x = p % self._w
@@ -171,6 +196,155 @@ class Covering:
         return "\n".join(out)
 
 
+# maps a piece (by identity) to its index in TETRIS_PIECES. FindCover
+# shuffles copies of the piece lists, the pieces themselves are shared.
+PIECE_INDEX = {id(p): n for n, p in enumerate(TETRIS_PIECES)}
+
+
+# glyph width -> per TETRIS_PIECES entry (min dx, max dx, max dy, mask of
+# the piece with its leftmost column at bit 0)
+PIECE_TEMPLATES = {}
+
+
+def _PieceTemplates(w):
+    templates = PIECE_TEMPLATES.get(w)
+    if templates is None:
+        templates = []
+        for piece in TETRIS_PIECES:
+            min_dx = min(dx for dx, _ in piece)
+            templates.append((min_dx, max(dx for dx, _ in piece),
+                              max(dy for _, dy in piece),
+                              sum(1 << (dx - min_dx + dy * w)
+                                  for dx, dy in piece)))
+        PIECE_TEMPLATES[w] = templates
+    return templates
+
+
+class BitCovering:
+    """Drop-in replacement for Covering backed by an int bitmask
+
+    Bit (x + y * w) is set while pixel (x, y) still needs to be covered.
+    The mask of a placement is the mask of the piece for the glyph width
+    (see _PieceTemplates) shifted to the cell, so fit/cover/uncover become
+    single AND/OR/XOR operations.
+    """
+
+    def __init__(self, points: List[POINT], w=None, h=None):
+        if w is None:
+            self._w = 1 + max(x for x, y in points)
+        else:
+            self._w = w
+        if h is None:
+            self._h = 1 + max(y for x, y in points)
+        else:
+            self._h = h
+        self._num_empty = len(points)
+        self._bits = [1 << p for p in range(self._w * self._h)]
+        self._empty = 0
+        for x, y in points:
+            self._empty |= 1 << (x + y * self._w)
+        self._templates = _PieceTemplates(self._w)
+        # cell -> (mask, tag) of the pieces currently placed
+        self._placed = {}
+        # cells a shift by one to the right (left) may set, i.e. all but
+        # the first (last) column, so that rows do not wrap around
+        full = (1 << (self._w * self._h)) - 1
+        first_col = sum(1 << (y * self._w) for y in range(self._h))
+        self._not_first_col = full & ~first_col
+        self._not_last_col = full & ~(first_col << (self._w - 1))
+
+    def not_covered(self):
+        return self._num_empty
+
+    def is_empty(self, p: POINT) -> bool:
+        x, y = p
+        if x < 0 or x >= self._w or y < 0 or y >= self._h:
+            return False
+        return self._empty & self._bits[x + y * self._w] != 0
+
+    def lowest_left(self) -> Optional[POINT]:
+        e = self._empty
+        if e == 0:
+            return None
+        p = (e & -e).bit_length() - 1
+        return (p % self._w, p // self._w)
+
+    def _mask(self, ll: POINT, piece: List[POINT]):
+        """The placement mask, None if the piece sticks out of the glyph"""
+        x, y = ll
+        min_dx, max_dx, max_dy, mask = self._templates[PIECE_INDEX[id(piece)]]
+        if x + min_dx < 0 or x + max_dx >= self._w or y + max_dy >= self._h:
+            return None
+        return mask << (x + min_dx + y * self._w)
+
+    def does_it_fit(self, ll: POINT, piece: List[POINT]) -> bool:
+        m = self._mask(ll, piece)
+        return m is not None and self._empty & m == m
+
+    def cover(self, ll: POINT, piece: List[POINT], tag):
+        assert tag != EMPTY
+        m = self._mask(ll, piece)
+        self._empty ^= m
+        self._num_empty -= len(piece)
+        self._placed[ll[0] + ll[1] * self._w] = (m, tag)
+
+    def uncover(self, ll: POINT, piece: List[POINT]):
+        m, _ = self._placed.pop(ll[0] + ll[1] * self._w)
+        assert self._empty & m == 0
+        self._empty |= m
+        self._num_empty += len(piece)
+
+    def _spread(self, m):
+        """m and its 4-neighbours (may include bits outside the glyph,
+        callers mask with the empty cells)"""
+        w = self._w
+        return (m | ((m << 1) & self._not_first_col) |
+                ((m >> 1) & self._not_last_col) | (m << w) | (m >> w))
+
+    def has_dead_region(self, ll: POINT, piece: List[POINT]) -> bool:
+        """HasDeadRegion on the bitmask: the regions next to the piece just
+        placed are grown a ring of neighbours at a time"""
+        limit = max(UNFILLABLE_SIZES) + 1
+        e = self._empty
+        seeds = self._spread(self._mask(ll, piece)) & e
+        while seeds:
+            region = seeds & -seeds
+            while True:
+                grown = (self._spread(region) & e) | region
+                if grown == region:
+                    if bin(region).count("1") in UNFILLABLE_SIZES:
+                        return True
+                    break
+                region = grown
+                if bin(region).count("1") >= limit:
+                    break
+            seeds &= ~region
+        return False
+
+    def RenderCover(self):
+        tags = {}
+        for m, tag in self._placed.values():
+            while m:
+                low = m & -m
+                tags[low.bit_length() - 1] = tag
+                m ^= low
+        out = []
+        for y in range(self._h):
+            line = [chr(tags[p] + ord("a")) if p in tags else "."
+                    for p in range(y * self._w, (y + 1) * self._w)]
+            out.append("".join(line))
+        return "\n".join(out)
+
+
+ENGINES = {
+    "list": Covering,
+    "bits": BitCovering,
+}
+# both engines explore the search tree in the same order and thus
+# produce identical tilings
+DEFAULT_ENGINE = "bits"
+
+
 FREE_PIECES = []
 for i in range(100):
     a = TETRIES_PIECES_NORMAL[:]
@@ -180,12 +354,194 @@ for i in range(100):
     FREE_PIECES.append(a+b)
 
 
-def FindCover(c: Covering, first_approx, verbose=False):
+class SolveStats:
+    """Counters collected by FindCover, SolveExactCover and SolveGlyph"""
+
+    def __init__(self):
+        # pieces placed on the board
+        self.nodes = 0
+        # candidate placements checked, placed or not
+        self.tried = 0
+        # pieces taken off the board again
+        self.backtracks = 0
+        # most pieces on the board at the same time
+        self.max_depth = 0
+        # placements rejected because they cut off an unfillable region
+        self.pruned = 0
+        # number of (re)started searches
+        self.attempts = 0
+        # True if the last search proved that no tiling exists
+        self.exhausted = False
+        # the (ll, piece) list of the partial tiling leaving the fewest
+        # pixels uncovered
+        self.best = []
+        self.best_uncovered = None
+        # outcome of SolveGlyph
+        self.seconds = 0.0
+        self.cheats = 0
+        self.fillers = 0
+
+
+# region sizes that cannot be written as 3 * a + 4 * b
+UNFILLABLE_SIZES = {1, 2, 5}
+
+# piece orders of FindCover: a fresh shuffle at every node or the
+# neighbourhood lookup table (see HeuristicPieces)
+ORDERS = ["shuffle", "heuristic"]
+DEFAULT_ORDER = "shuffle"
+
+
+def _Neighbours(x, y):
+    return ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+
+
+# The cells around the lowest left empty cell that decide which pieces fit
+# there and whether a piece seals off a single cell: the cells of all
+# pieces and their neighbours. Cells above and left of it are covered.
+PIECE_CELLS = sorted({p for piece in TETRIS_PIECES for p in piece})
+WINDOW = sorted({q for p in PIECE_CELLS for q in _Neighbours(*p) + (p,)
+                 if q[1] > 0 or (q[1] == 0 and q[0] > 0)},
+                key=lambda p: (p[1], p[0]))
+WINDOW_BIT = {p: 1 << n for n, p in enumerate(WINDOW)}
+# neighbourhood pattern -> [(sort key, piece index)] of the pieces that fit
+PATTERN_TABLE = {}
+
+
+def Neighbourhood(c: Covering, ll: POINT) -> int:
+    """The empty cells of the WINDOW around ll as a bitmask"""
+    x, y = ll
+    pattern = 0
+    for dx, dy in WINDOW:
+        if c.is_empty((x + dx, y + dy)):
+            pattern |= WINDOW_BIT[(dx, dy)]
+    return pattern
+
+
+def _PatternEntry(pattern):
+    """The pieces that fit at the origin of a neighbourhood pattern with
+    their sort keys
+
+    Pieces that leave a window cell without an empty neighbour (a region
+    of size 1) are left out. Tetrominoes come before the 3 cell pieces and
+    pieces covering more of the current row before the others, so the
+    search leaves fewer holes behind the scan line.
+    """
+    # every piece covers the lowest left cell (0, 0) itself
+    empty = {p for p in WINDOW if pattern & WINDOW_BIT[p]} | {(0, 0)}
+    out = []
+    for n, piece in enumerate(TETRIS_PIECES):
+        if any(p not in empty for p in piece):
+            continue
+        left = empty - set(piece)
+        # only cells whose neighbours all lie in the window are known to
+        # be sealed off
+        if any(all(q not in left and (q in WINDOW_BIT or q[1] < 0 or
+                                      (q[1] == 0 and q[0] <= 0))
+                   for q in _Neighbours(*p))
+               for p in left):
+            continue
+        row = sum(1 for _, dy in piece if dy == 0)
+        out.append(((len(piece) != 4, -row), n))
+    return out
+
+
+def HeuristicPieces(pattern, rank):
+    """The candidate pieces for a neighbourhood pattern in search order
+
+    rank is a permutation of the piece indices breaking the ties, drawn
+    once per search so that different seeds give different tilings.
+    """
+    entry = PATTERN_TABLE.get(pattern)
+    if entry is None:
+        entry = PATTERN_TABLE[pattern] = _PatternEntry(pattern)
+    return [TETRIS_PIECES[n] for _, n in
+            sorted(entry, key=lambda e: (e[0], rank[e[1]]))]
+
+
+def HasDeadRegion(c: Covering, ll: POINT, piece: List[POINT]) -> bool:
+    """Checks whether the piece just placed at ll isolates an unfillable region
+
+    Only the empty regions bordering the piece are flood filled and the
+    fill stops as soon as a region is known to be large enough.
+    """
+    if isinstance(c, BitCovering):
+        return c.has_dead_region(ll, piece)
+    limit = max(UNFILLABLE_SIZES) + 1
+    seen = set()
+    for dx, dy in piece:
+        x, y = ll[0] + dx, ll[1] + dy
+        for start in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if start in seen or not c.is_empty(start):
+                continue
+            region = {start}
+            todo = [start]
+            while todo and len(region) < limit:
+                px, py = todo.pop()
+                for q in ((px - 1, py), (px + 1, py), (px, py - 1), (px, py + 1)):
+                    if q not in region and c.is_empty(q):
+                        region.add(q)
+                        todo.append(q)
+            if len(region) in UNFILLABLE_SIZES:
+                return True
+            seen |= region
+    return False
+
+
+def FindCover(c: Covering, first_approx, verbose=False, rng=random,
+              prune=True, stats=None, max_nodes=None, deadline=None,
+              order=DEFAULT_ORDER):
+    """Yields every complete cover of `c` found by randomized depth first search
+
+    The search gives up (without a yield) once it expanded max_nodes nodes
+    or time.monotonic() passes the deadline. stats.exhausted tells whether
+    it ended because no (further) cover exists.
+
+    With order "heuristic" the candidate pieces at a cell come from the
+    neighbourhood lookup table instead of a shuffle per node. The
+    randomness is a single permutation of the pieces per search.
+    """
+    if stats is None:
+        stats = SolveStats()
+    stats.exhausted = False
+    if max_nodes is not None:
+        max_nodes += stats.nodes
     best_so_far = c.not_covered()
+    if stats.best_uncovered is None or best_so_far < stats.best_uncovered:
+        stats.best_uncovered = best_so_far
+        stats.best = []
     # contains tuples: (lower-left,index,piece-list)
     stack = []
+    if order == "heuristic":
+        rank = list(range(len(TETRIS_PIECES)))
+        rng.shuffle(rank)
+        # neighbourhood pattern -> candidate pieces, shared by all nodes
+        candidates = {}
+
+    def place(ll, pieces, start):
+        for n in range(start, len(pieces)):
+            piece = pieces[n]
+            if c.does_it_fit(ll, piece):
+                # print(f"# add {ll} {n}")
+                c.cover(ll, piece, n)
+                if prune and HasDeadRegion(c, ll, piece):
+                    c.uncover(ll, piece)
+                    stats.pruned += 1
+                    continue
+                # counted once per placement rather than per candidate
+                stats.tried += n - start + 1
+                stats.nodes += 1
+                stack.append((ll, n, pieces))
+                if len(stack) > stats.max_depth:
+                    stats.max_depth = len(stack)
+                return True
+        stats.tried += len(pieces) - start
+        return False
 
     while True:
+        if max_nodes is not None and stats.nodes >= max_nodes:
+            return
+        if deadline is not None and time.monotonic() > deadline:
+            return
         ep = c.not_covered()
         if ep < best_so_far:
             if verbose:
@@ -193,60 +549,86 @@ def FindCover(c: Covering, first_approx, verbose=False):
             # if ep < first_approx:
             #    print(c.RenderCover())
             best_so_far = ep
+            if ep < stats.best_uncovered:
+                stats.best_uncovered = ep
+                stats.best = [(ll, pieces[n]) for ll, n, pieces in stack]
 
         backtrack = True
         if ep == 0:
-            cheats = 0
-            for x in c._bitmap:
-                if x in CHEAT_PIECES:
-                    cheats += 1
-            yield ep, cheats // 3, stack
+            cheats = sum(1 for _, n, pieces in stack if len(pieces[n]) != 4)
+            yield ep, cheats, stack
         else:
             ll = c.lowest_left()
-            if 1:
+            if order == "heuristic":
+                pattern = Neighbourhood(c, ll)
+                pieces = candidates.get(pattern)
+                if pieces is None:
+                    pieces = candidates[pattern] = HeuristicPieces(pattern,
+                                                                   rank)
+            elif 1:
                 a = TETRIES_PIECES_NORMAL[:]
                 b = TETRIES_PIECES_CHEATS[:]
-                random.shuffle(a)
-                random.shuffle(b)
+                rng.shuffle(a)
+                rng.shuffle(b)
                 pieces = a + b
             else:
                 pieces = FREE_PIECES[len(stack)]
-
-            for n, piece in enumerate(pieces):
-                if c.does_it_fit(ll, piece):
-                    # print(f"# add1 {ll} {n}")
-                    c.cover(ll, piece, n)
-                    stack.append((ll, n, pieces))
-                    backtrack = False
-                    break
+            backtrack = not place(ll, pieces, 0)
 
         while backtrack:
+            if not stack:
+                # search space exhausted
+                stats.exhausted = True
+                return
             ll, p, pieces = stack.pop(-1)
             c.uncover(ll, pieces[p])
+            stats.backtracks += 1
             # print(f"# rem {ll} {n}")
-            for n, piece in enumerate(pieces):
-                if n <= p:
-                    continue
-                if c.does_it_fit(ll, piece):
-                    # print(f"# add2 {ll} {n}")
-                    c.cover(ll, piece, n)
-                    stack.append((ll, n, pieces))
-                    backtrack = False
-                    break
+            backtrack = not place(ll, pieces, p + 1)
 
 
-def CheckSurface(surface):
-    points = []
-    w, h = surface.size
-    for y in range(h):
-        for x in range(w):
-            pixel = surface.getpixel((x, y))
-            if pixel[0] == 0:
-                points.append((x, y))
-    covering = Covering(points, w, h)
-    for x, cheats, patterns in FindCover(covering, 20):
+def MaskPoints(mask) -> List[POINT]:
+    """The (x, y) coordinates of all True pixels of a (h, w) bool array
+
+    Points are ordered row by row like the cells of a Covering.
+    """
+    ys, xs = np.nonzero(mask)
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def SurfacePoints(surface) -> List[POINT]:
+    return MaskPoints(GrayArray(surface) == 0)
+
+
+def RenderAtlas(font, chars, w, h):
+    """Renders all chars into one image and returns a (h, w) uint8 gray
+    level array per char (0 is ink)
+
+    Cells are padded by the largest negative left bearing so a glyph cannot
+    bleed into its neighbour; ink left of the origin is cut off just like
+    when rendering the glyph on its own.
+    """
+    if not chars:
+        return []
+    pad = max(0, -min(font.getbbox(c)[0] for c in chars))
+    stride = w + pad
+    atlas = Image.new("L", (stride * len(chars), h), 255)
+    draw = ImageDraw.Draw(atlas)
+    for i, c in enumerate(chars):
+        draw.text((i * stride + pad, 0), c, font=font, fill=0)
+    gray = np.asarray(atlas)
+    return [gray[:, i * stride + pad:i * stride + pad + w]
+            for i in range(len(chars))]
+
+
+def CheckPoints(points: List[POINT], w, h, rng=random,
+                engine=DEFAULT_ENGINE):
+    covering = ENGINES[engine](points, w, h)
+    stats = SolveStats()
+    for x, cheats, patterns in FindCover(covering, 20, rng=rng, stats=stats):
         print("")
-        print(f"Stats: ep={x} cheats={cheats} pieces={len(patterns)}")
+        print(f"Stats: ep={x} cheats={cheats} pieces={len(patterns)} "
+              f"nodes={stats.nodes} pruned={stats.pruned}")
         print(covering.RenderCover())
         for ll, index, all in patterns:
             print(ll, all[index], end=" ")
@@ -254,55 +636,990 @@ def CheckSurface(surface):
         return patterns
 
 
-def CmpPieces(piece1, piece2):
-    (o1x, o1y), p1 = piece1
-    (o2x, o2y), p2, = piece2
-    maxy1 = max(o1y + y for _, y in p1)
-    maxy2 = max(o2y + y for _, y in p2)
-    if maxy1 < maxy2:
-        return 1
-    if maxy2 > maxy1:
-        return -1
+def CheckSurface(surface, rng=random, engine=DEFAULT_ENGINE):
+    w, h = surface.size
+    return CheckPoints(SurfacePoints(surface), w, h, rng, engine)
+
+
+SOLVERS = ["dfs", "dlx"]
+DEFAULT_SOLVER = "dfs"
+
+
+def SolveExactCover(points: List[POINT], rng=random, min_cheats=False,
+                    max_nodes=200000, deadline=None, stats=None):
+    """Tiles the points with TETRIS_PIECES using Algorithm X / Dancing Links
+
+    Every glyph pixel is a column and every placement of a piece that lies
+    inside the glyph is a row. The search always branches on the column
+    with the fewest remaining rows. Returns a list of (ll, piece) or None
+    if the glyph cannot be tiled.
+
+    With min_cheats the search continues past the first solution and
+    returns the one with the fewest CHEAT_PIECES found within max_nodes
+    placed pieces (SolveStats.nodes). The search is abandoned once
+    time.monotonic() passes the deadline. stats.exhausted tells whether
+    it ran to the end, i.e. None means that no tiling exists.
+    """
+    column = {p: n + 1 for n, p in enumerate(points)}
+    ncols = len(points)
+    # node 0 is the root, nodes 1..ncols are the column headers
+    L = list(range(-1, ncols))
+    L[0] = ncols
+    R = list(range(1, ncols + 2))
+    R[ncols] = 0
+    U = list(range(ncols + 1))
+    D = list(range(ncols + 1))
+    C = list(range(ncols + 1))
+    S = [0] * (ncols + 1)
+    ROW = [None] * (ncols + 1)
+
+    # one random piece order per glyph, regular pieces before cheats
+    normal = [n for n in range(len(TETRIS_PIECES)) if n not in CHEAT_PIECES]
+    cheats = sorted(CHEAT_PIECES)
+    rng.shuffle(normal)
+    rng.shuffle(cheats)
+    rows = []
+    for x, y in points:
+        for k in normal + cheats:
+            cols = [column.get((x + dx, y + dy)) for dx, dy in TETRIS_PIECES[k]]
+            if None in cols:
+                continue
+            first = len(L)
+            for n, c in enumerate(cols):
+                node = first + n
+                L.append(first + (n - 1) % len(cols))
+                R.append(first + (n + 1) % len(cols))
+                U.append(U[c])
+                D.append(c)
+                D[U[c]] = node
+                U[c] = node
+                C.append(c)
+                ROW.append(len(rows))
+                S[c] += 1
+            rows.append(((x, y), k))
+
+    def cover(c):
+        L[R[c]] = L[c]
+        R[L[c]] = R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(c):
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = c
+        R[L[c]] = c
+
+    solution = []
+    best = None
+    nodes = 0
+    tried = 0
+    max_depth = 0
+
+    # one [column, row tried, cheats, cells left] entry per placed piece
+    # instead of recursion, a large glyph takes hundreds of pieces
+    stack = []
+    num_cheats = 0
+    remaining = ncols
+    descend = True
+    stop = False
+    while True:
+        if descend:
+            descend = False
+            if R[0] == 0:
+                best = (num_cheats, solution[:])
+                # 3 * cheats + 4 * normal = len(points) bounds the cheats
+                stop = not min_cheats or num_cheats == (3 * ncols) % 4
+            else:
+                c = R[0]
+                j = R[c]
+                while j != 0:
+                    if S[j] < S[c]:
+                        c = j
+                    j = R[j]
+                if S[c] != 0:
+                    cover(c)
+                    stack.append([c, c, num_cheats, remaining])
+        if not stack:
+            break
+        frame = stack[-1]
+        c, r, num_cheats, remaining = frame
+        if r != c:
+            # undo the row tried last
+            j = L[r]
+            while j != r:
+                uncover(C[j])
+                j = L[j]
+            solution.pop()
+        r = D[r]
+        while r != c and not stop:
+            tried += 1
+            if ((nodes >= max_nodes and best is not None) or
+                    (deadline is not None and time.monotonic() > deadline)):
+                stop = True
+                break
+            ll, k = rows[ROW[r]]
+            n = len(TETRIS_PIECES[k])
+            more_cheats = num_cheats + (k in CHEAT_PIECES)
+            left = remaining - n
+            if (best is None or
+                    more_cheats + (3 * left) % 4 < best[0]):
+                nodes += 1
+                solution.append(rows[ROW[r]])
+                if len(solution) > max_depth:
+                    max_depth = len(solution)
+                j = R[r]
+                while j != r:
+                    cover(C[j])
+                    j = R[j]
+                frame[1] = r
+                num_cheats = more_cheats
+                remaining = left
+                descend = True
+                break
+            r = D[r]
+        if not descend:
+            uncover(c)
+            stack.pop()
+
+    if stats is not None:
+        stats.exhausted = not stop
+        stats.nodes += nodes
+        stats.tried += tried
+        # every placement is undone again once the search returns
+        stats.backtracks += nodes
+        stats.max_depth = max(stats.max_depth, max_depth)
+    if best is None:
+        return None
+    return [(ll, TETRIS_PIECES[k]) for ll, k in best[1]]
+
+
+def _FallGraph(pieces):
+    """Returns the pieces directly below every piece and the pieces in
+    order of their lowest cell (bottom first)
+
+    y grows downwards. The cells are bucketed by row and the rows scanned
+    from the bottom up, so every column is visited bottom to top in time
+    linear in the number of cells.
+    """
+    rows = collections.defaultdict(list)
+    for n, ((ox, oy), piece) in enumerate(pieces):
+        for x, y in piece:
+            rows[oy + y].append((ox + x, n))
+    below = [[] for _ in pieces]
+    bottom_first = []
+    seen = [False] * len(pieces)
+    # column -> piece of the topmost cell visited so far
+    top = {}
+    for y in range(max(rows, default=0), min(rows, default=0) - 1, -1):
+        for x, n in rows.get(y, ()):
+            prev = top.get(x)
+            if prev is not None and prev != n:
+                below[n].append(prev)
+            top[x] = n
+            if not seen[n]:
+                seen[n] = True
+                bottom_first.append(n)
+    return below, bottom_first
 
-    pm = {}
-    for x, y in p1:
-        pm[x + o1x] = min(pm.get(x + o1x, y + o1y),  y + o1y)
-    for x, y in p2:
-        if pm.get(x + o2x, y + o2y) < y + o2y:
-            return 1
-    return -1
+
+def FallOrderViolations(pieces) -> int:
+    """The number of places where a piece lands before the piece right
+    below it in one of its columns, i.e. would fall through it"""
+    below, _ = _FallGraph(pieces)
+    return sum(1 for n, others in enumerate(below) for m in others if m > n)
 
 
 def SortPieces(pieces):
-    return sorted(pieces, key=functools.cmp_to_key(CmpPieces))
-
-
-def MakeFontTab(font, font_size, chars):
-    font = ImageFont.truetype(font, font_size)
-    max_w = 0
-    max_h = 0
-    for c in chars:
-        l, t, r, b = font.getbbox(c)
-        if r > max_w:
-            max_w = r
-        if b > max_h:
-            max_h = b
-    print(f"Dim: {max_w}x{max_h}")
-    txt = Image.new("RGBA", (max_w, max_h), BLACK)
-    draw = ImageDraw.Draw(txt)
-    out = {}
-    for c in chars:
-        draw.rectangle((0, 0) + (max_w, max_h),  fill=WHITE)
-        draw.text((0, 0), c, font=font, fill=BLACK)
+    """Returns the (ll, piece) list in fall order
+
+    Every piece comes after the pieces below it in any of its columns
+    (a topological order of the support graph), otherwise the pieces
+    come bottom first. Interlocking pieces that support each other cannot
+    all be ordered, the edges closing such a cycle are dropped and
+    reported.
+    """
+    below, bottom_first = _FallGraph(pieces)
+    order = []
+    # 0: not visited, 1: on the stack, 2: placed
+    state = [0] * len(pieces)
+    cycles = 0
+    for root in bottom_first:
+        if state[root]:
+            continue
+        state[root] = 1
+        # depth first, a piece is placed once everything below it is
+        stack = [(root, 0)]
+        while stack:
+            n, i = stack[-1]
+            if i < len(below[n]):
+                stack[-1] = (n, i + 1)
+                m = below[n][i]
+                if state[m] == 0:
+                    state[m] = 1
+                    stack.append((m, 0))
+                elif state[m] == 1:
+                    cycles += 1
+                continue
+            stack.pop()
+            state[n] = 2
+            order.append(n)
+    out = [pieces[n] for n in order]
+    violations = FallOrderViolations(out)
+    assert violations <= cycles, (violations, cycles)
+    if violations:
+        logging.warning(f"{violations} pieces fall through others "
+                        f"({cycles} support cycle edges dropped)")
+    return out
+
+
+# Bump this whenever the solver changes in a way that invalidates
+# previously computed tilings.
+CACHE_VERSION = 5
+DEFAULT_CACHE_PATH = os.path.expanduser("~/.cache/tetris_scroller/tilings")
+
+
+def PiecesDigest() -> str:
+    return hashlib.sha256(repr(TETRIS_PIECES).encode()).hexdigest()
+
+
+def FontDigest(font_path) -> str:
+    h = hashlib.sha256()
+    with open(font_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# first four bytes of TrueType, OpenType (CFF), Apple TrueType and
+# TrueType collection files
+SFNT_MAGICS = (b"\x00\x01\x00\x00", b"OTTO", b"true", b"ttcf")
+
+
+def FontCodepoints(font_path) -> Set[int]:
+    """The code points mapped to a glyph by the cmap table of a TrueType or
+    OpenType font (first font of a collection)
+
+    Only the Unicode subtables in format 4 (BMP) and 12 (full range) are
+    read, an empty set means the font has neither. It is also empty for
+    other formats FreeType reads, like BDF and PCF bitmap fonts, and for
+    a truncated or corrupt cmap.
+    """
+    with open(font_path, "rb") as fp:
+        data = fp.read()
+    if data[:4] not in SFNT_MAGICS:
+        return set()
+    try:
+        return _ReadCmap(data)
+    except (struct.error, IndexError) as err:
+        logging.warning(f"cannot read the cmap of {font_path}: {err}")
+        return set()
+
+
+def _ReadCmap(data) -> Set[int]:
+    base = 0
+    if data[:4] == b"ttcf":
+        base = struct.unpack_from(">I", data, 12)[0]
+    num_tables = struct.unpack_from(">H", data, base + 4)[0]
+    cmap = None
+    for n in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data,
+                                               base + 12 + 16 * n)
+        if tag == b"cmap":
+            cmap = offset
+    out = set()
+    if cmap is None:
+        return out
+    for n in range(struct.unpack_from(">H", data, cmap + 2)[0]):
+        platform, encoding, offset = struct.unpack_from(
+            ">HHI", data, cmap + 4 + 8 * n)
+        if platform != 0 and not (platform == 3 and encoding in (1, 10)):
+            continue
+        sub = cmap + offset
+        fmt = struct.unpack_from(">H", data, sub)[0]
+        if fmt == 4:
+            seg_x2 = struct.unpack_from(">H", data, sub + 6)[0]
+            segs = seg_x2 // 2
+            ends = struct.unpack_from(f">{segs}H", data, sub + 14)
+            starts = struct.unpack_from(f">{segs}H", data, sub + 16 + seg_x2)
+            deltas = struct.unpack_from(f">{segs}h", data,
+                                        sub + 16 + 2 * seg_x2)
+            offsets_pos = sub + 16 + 3 * seg_x2
+            range_offsets = struct.unpack_from(f">{segs}H", data, offsets_pos)
+            for k in range(segs):
+                for cp in range(starts[k], min(ends[k], 0xFFFE) + 1):
+                    if range_offsets[k] == 0:
+                        glyph = (cp + deltas[k]) & 0xFFFF
+                    else:
+                        glyph = struct.unpack_from(
+                            ">H", data, offsets_pos + 2 * k + range_offsets[k] +
+                            2 * (cp - starts[k]))[0]
+                    if glyph:
+                        out.add(cp)
+        elif fmt == 12:
+            groups = struct.unpack_from(">I", data, sub + 12)[0]
+            for k in range(groups):
+                start, end, glyph = struct.unpack_from(">III", data,
+                                                       sub + 16 + 12 * k)
+                out.update(range(start if glyph else start + 1, end + 1))
+    return out
+
+
+def ParseCharset(spec, font_path=None) -> str:
+    """Returns the glyphs selected by a comma separated charset spec
+
+    Items are "default" (CHARS), "all" (every glyph of the font), a code
+    point like "20AC" or "U+20AC" or a range like "0400-04FF". If the
+    font is given, code points it has no glyph for are dropped, as are
+    control, format and space characters.
+    """
+    available = FontCodepoints(font_path) if font_path else set()
+    out = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item == "default":
+            out += CHARS
+        elif item == "all":
+            if not available:
+                raise ValueError(f"cannot read the cmap of {font_path}")
+            out += [chr(cp) for cp in sorted(available)]
+        elif item:
+            first, _, last = item.partition("-")
+            first = int(first.upper().removeprefix("U+"), 16)
+            last = int(last.upper().removeprefix("U+"), 16) if last else first
+            out += [chr(cp) for cp in range(first, last + 1)]
+    return "".join(
+        c for c in dict.fromkeys(out)
+        if unicodedata.category(c)[0] not in "CZ" and
+        (not available or ord(c) in available))
+
+
+def AddCharsetArgs(parser):
+    parser.add_argument("--charset", action="store",  type=str,
+                        help="Glyphs to tile: comma separated 'default', "
+                        "'all' (the whole font) or hex code points and "
+                        "ranges like 0400-04FF.",
+                        default="default")
+
+
+class TilingCache:
+    """Persistent store for the sorted (ll, piece) lists of MakeFontTab
+
+    Entries are keyed by font file digest, font size, rng seed, solver
+    variant and glyph. The store is a directory with one JSON file per
+    font digest and size, read on first use: a scroller only loads the
+    tilings of its own font and saving rewrites only the files that got
+    new entries.
+    A file is discarded if it was written by a different CACHE_VERSION or
+    for a different TETRIS_PIECES table.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        # "<font digest>-<font size>" -> key -> entry
+        self._files = {}
+        self._dirty = set()
+
+    @staticmethod
+    def Key(font_digest, font_size, seed, variant, c) -> str:
+        return f"{font_digest}:{font_size}:{seed}:{variant}:{ord(c)}"
+
+    def _Entries(self, key):
+        """Returns the file name and the entries of the file of key"""
+        font_digest, font_size, _ = key.split(":", 2)
+        name = f"{font_digest}-{font_size}"
+        entries = self._files.get(name)
+        if entries is None:
+            entries = self._files[name] = self._Load(self._File(name))
+        return name, entries
+
+    def _File(self, name):
+        return os.path.join(self._path, name + ".json")
+
+    @staticmethod
+    def _Load(path):
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            logging.warning(f"ignoring unreadable tiling cache {path}: {err}")
+            return {}
+        if (data.get("version") != CACHE_VERSION or
+                data.get("pieces") != PiecesDigest()):
+            logging.info(f"tiling cache {path} is stale - rebuilding")
+            return {}
+        return data.get("entries", {})
+
+    def get(self, key):
+        entry = self._Entries(key)[1].get(key)
+        if entry is None:
+            return None
+        return [(tuple(ll), [tuple(p) for p in piece]) for ll, piece in entry]
+
+    def put(self, key, patterns):
+        name, entries = self._Entries(key)
+        entries[key] = [[list(ll), [list(p) for p in piece]]
+                        for ll, piece in patterns]
+        self._dirty.add(name)
+
+    def save(self):
+        for name in sorted(self._dirty):
+            path = self._File(name)
+            data = {"version": CACHE_VERSION,
+                    "pieces": PiecesDigest(),
+                    "entries": self._files[name]}
+            tmp = path + ".tmp"
+            try:
+                os.makedirs(self._path, exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as fp:
+                    json.dump(data, fp)
+                os.replace(tmp, path)
+                self._dirty.discard(name)
+            except OSError as err:
+                logging.warning(f"cannot write tiling cache {path}: {err}")
+
+
+# stands in for pixels that could not be covered within the search budget
+FILLER_PIECE = [(0, 0)]
+
+
+class SolverOptions:
+    """Solver settings for SolveGlyph (shipped as a whole to the workers)"""
+
+    def __init__(self, engine=DEFAULT_ENGINE, solver=DEFAULT_SOLVER,
+                 min_cheats=False, prune=True, max_nodes=20000, timeout=10.0,
+                 restarts=3, order=DEFAULT_ORDER):
+        self.engine = engine
+        self.solver = solver
+        self.min_cheats = min_cheats
+        # piece order of the dfs, see FindCover
+        self.order = order
+        self.prune = prune
+        # node budget of a single dfs attempt
+        self.max_nodes = max_nodes
+        # wall clock budget in seconds for all attempts of a glyph
+        self.timeout = timeout
+        # dfs attempts with a reseeded piece order after the first one
+        self.restarts = restarts
+
+    def Variant(self) -> str:
+        """The part of the cache key that depends on the options"""
+        return (self.solver + ("-min" if self.min_cheats else "") +
+                ("" if self.order == DEFAULT_ORDER else f"-{self.order}"))
+
+
+def AddSolverArgs(parser):
+    parser.add_argument("--engine", action="store",  type=str,
+                        help="Board representation used by the solver.",
+                        choices=sorted(ENGINES), default=DEFAULT_ENGINE)
+    parser.add_argument("--solver", action="store",  type=str,
+                        help="Randomized depth first search or exact cover.",
+                        choices=SOLVERS, default=DEFAULT_SOLVER)
+    parser.add_argument("--order", action="store",  type=str,
+                        help="dfs piece order: shuffled at every node or "
+                        "from the neighbourhood lookup table.",
+                        choices=ORDERS, default=DEFAULT_ORDER)
+    parser.add_argument("--min_cheats", action="store_true",
+                        help="dlx only: minimize the number of 3 cell pieces.")
+    parser.add_argument("--max_nodes", action="store",  type=int,
+                        help="Node budget per search attempt and glyph.",
+                        default=20000)
+    parser.add_argument("--timeout", action="store",  type=float,
+                        help="Time budget per glyph in seconds.",
+                        default=10.0)
+    parser.add_argument("--restarts", action="store",  type=int,
+                        help="Reseeded searches once the node budget is spent.",
+                        default=3)
+
+
+def SolverOptionsFromArgs(args) -> SolverOptions:
+    return SolverOptions(engine=args.engine, solver=args.solver,
+                         min_cheats=args.min_cheats, max_nodes=args.max_nodes,
+                         timeout=args.timeout, restarts=args.restarts,
+                         order=args.order)
+
+
+PROFILERS = ["cprofile", "pyinstrument"]
+
+
+def AddTilingArgs(parser):
+    parser.add_argument("--cache_path", action="store",  type=str,
+                        help="Tiling cache directory (empty string disables).",
+                        default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--jobs", action="store",  type=int,
+                        help="Worker processes for tiling (0 = all cores).",
+                        default=1)
+    parser.add_argument("--verbose", action="store_true",
+                        help="Log glyph bitmaps.")
+
+
+def AddProfileArgs(parser):
+    parser.add_argument("--profile", action="store",  type=str,
+                        help="Profile building the font tab and write the "
+                        "report to this file ('-' for stderr).",
+                        default=None)
+    parser.add_argument("--profiler", action="store",  type=str,
+                        help="Profiler used by --profile.",
+                        choices=PROFILERS, default=PROFILERS[0])
+
+
+def Profiled(args, func, *func_args, **func_kwargs):
+    """Calls func(*func_args, **func_kwargs), under a profiler if
+    args.profile is set
+
+    cprofile writes a pstats file (or prints the top functions for '-'),
+    pyinstrument (which must be installed) a text report. Without
+    --profile this is a plain call.
+    """
+    if not args.profile:
+        return func(*func_args, **func_kwargs)
+    if args.profiler == "pyinstrument":
+        import pyinstrument
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            return func(*func_args, **func_kwargs)
+        finally:
+            profiler.stop()
+            report = profiler.output_text()
+            if args.profile == "-":
+                print(report, file=sys.stderr)
+            else:
+                with open(args.profile, "w") as fp:
+                    fp.write(report)
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *func_args, **func_kwargs)
+    finally:
+        if args.profile == "-":
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+                "cumulative").print_stats(30)
+        else:
+            profiler.dump_stats(args.profile)
+            logging.info(f"profile written to {args.profile}")
+
+
+def BudgetedCover(points: List[POINT], w, h, seed, options: SolverOptions,
+                  stats: SolveStats, deadline):
+    for attempt in range(1 + options.restarts):
+        rng = random.Random(seed if attempt == 0 else f"{seed}/{attempt}")
+        covering = ENGINES[options.engine](points, w, h)
+        stats.attempts += 1
+        for _, _, stack in FindCover(covering, 20, rng=rng,
+                                     prune=options.prune, stats=stats,
+                                     max_nodes=options.max_nodes,
+                                     deadline=deadline, order=options.order):
+            return [(ll, pieces[n]) for ll, n, pieces in stack]
+        # a different piece order cannot help if no tiling exists
+        if stats.exhausted or time.monotonic() > deadline:
+            break
+    return None
+
+
+def FillGaps(points: List[POINT], w, h, patterns):
+    """Completes a partial tiling greedily
+
+    Pixels no piece fits on any more are covered with a FILLER_PIECE.
+    """
+    c = Covering(points, w, h)
+    for ll, piece in patterns:
+        c.cover(ll, piece, 0)
+    patterns = patterns[:]
+    while c.not_covered():
+        ll = c.lowest_left()
+        for piece in TETRIES_PIECES_NORMAL + TETRIES_PIECES_CHEATS + [FILLER_PIECE]:
+            if c.does_it_fit(ll, piece):
+                c.cover(ll, piece, 0)
+                patterns.append((ll, piece))
+                break
+    return patterns
+
+
+def SolveGlyph(points: List[POINT], w, h, seed, options=None, stats=None,
+               name=None):
+    """Returns the sorted (ll, piece) list for a single glyph bitmap
+
+    Glyphs that cannot be tiled within the budget of the options are
+    completed with single pixel FILLER_PIECEs. If given, stats is filled
+    in with the search counters and the outcome. name (the glyphs of the
+    bitmap) is logged instead of the seed.
+    """
+    if options is None:
+        options = SolverOptions()
+    if stats is None:
+        stats = SolveStats()
+    start = time.monotonic()
+    deadline = start + options.timeout
+    patterns = None
+    if options.solver == "dlx":
+        patterns = SolveExactCover(points, random.Random(seed),
+                                   options.min_cheats, options.max_nodes,
+                                   deadline=deadline, stats=stats)
+    # no dfs restarts if the exact cover search proved there is no tiling
+    if patterns is None and not stats.exhausted:
+        patterns = BudgetedCover(points, w, h, seed, options, stats, deadline)
+    if patterns is None:
+        patterns = FillGaps(points, w, h, stats.best)
+        stats.fillers = sum(1 for _, piece in patterns
+                            if piece is FILLER_PIECE)
+    stats.cheats = sum(1 for _, piece in patterns if len(piece) == 3)
+    stats.seconds = time.monotonic() - start
+    msg = (f"glyph {seed if name is None else f'[{name}]'}: pieces={len(patterns)} cheats={stats.cheats} "
+           f"fillers={stats.fillers} attempts={stats.attempts} "
+           f"nodes={stats.nodes} tried={stats.tried} "
+           f"backtracks={stats.backtracks} max_depth={stats.max_depth} "
+           f"pruned={stats.pruned} time={stats.seconds:.3f}s")
+    if stats.fillers:
+        logging.warning(msg)
+    else:
+        logging.info(msg)
+    return SortPieces(patterns)
+
+
+def SolveGlyphWithStats(points: List[POINT], w, h, seed, options=None,
+                        name=None):
+    """SolveGlyph returning (patterns, stats) so workers can ship the stats"""
+    stats = SolveStats()
+    patterns = SolveGlyph(points, w, h, seed, options, stats, name)
+    # the partial tiling is of no use to the caller
+    stats.best = []
+    return patterns, stats
+
+
+def MakePool(jobs):
+    """A process pool for SolveGlyphs, None for jobs == 1 (0 = all cores)
+
+    The workers are started by a forkserver (spawned where there is none)
+    rather than forked from the caller, which may already run threads
+    that hold locks, e.g. logging's.
+    """
+    if jobs == 1:
+        return None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # workers start without importing pygame & co. again
+        context.set_forkserver_preload(["tetris_font"])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return concurrent.futures.ProcessPoolExecutor(max_workers=jobs or None,
+                                                  mp_context=context)
+
+
+def SolveGlyphs(tasks, jobs=1, pool=None):
+    """Runs SolveGlyph over a list of tasks (tuples of SolveGlyph args)
+
+    Returns a (patterns, SolveStats) pair per task. With a pool (see
+    MakePool) or jobs != 1 the tasks are farmed out to worker processes.
+    Results come back in task order and only depend on the per task seed
+    so the outcome does not depend on the number of workers.
+    """
+    if len(tasks) <= 1 or (pool is None and jobs == 1):
+        return [SolveGlyphWithStats(*task) for task in tasks]
+    if pool is not None:
+        return list(pool.map(SolveGlyphWithStats, *zip(*tasks)))
+    with MakePool(jobs) as pool:
+        return list(pool.map(SolveGlyphWithStats, *zip(*tasks)))
+
+
+class FontTabStats:
+    """Per glyph SolveStats of a MakeFontTab/TileGlyphs run"""
+
+    def __init__(self):
+        # glyph -> SolveStats, glyphs sharing a bitmap share the stats
+        self.glyphs = {}
+        # glyphs found in the tiling cache
+        self.cached = 0
+        self.seconds = 0.0
+
+    def Totals(self):
+        solved = {id(s): s for s in self.glyphs.values()}.values()
+        out = {"glyphs": len(self.glyphs) + self.cached,
+               "cached": self.cached,
+               "solved": len(solved),
+               "seconds": self.seconds}
+        for name in ("nodes", "tried", "backtracks", "pruned", "attempts",
+                     "cheats", "fillers"):
+            out[name] = sum(getattr(s, name) for s in solved)
+        out["max_depth"] = max((s.max_depth for s in solved), default=0)
+        out["solve_seconds"] = sum(s.seconds for s in solved)
+        return out
+
+    def Slowest(self, n=3):
+        """The n glyphs that took longest to solve as (glyph, SolveStats)"""
+        return sorted(self.glyphs.items(), key=lambda x: -x[1].seconds)[:n]
+
+    def Log(self):
+        totals = self.Totals()
+        logging.info(" ".join(
+            f"{k}={v:.3f}s" if k.endswith("seconds") else f"{k}={v}"
+            for k, v in totals.items()))
+        if totals["solved"]:
+            logging.info("slowest: " + " ".join(
+                f"[{c}]={s.seconds:.3f}s" for c, s in self.Slowest()))
+
+
+def TileGlyphs(masks, w, h, seed=DEFAULT_SEED, jobs=1, options=None,
+               stats=None, pool=None):
+    """Tiles glyph bitmaps given as a glyph -> (h, w) bool array map
+
+    Returns a glyph -> sorted (ll, piece) list map. If given, the
+    FontTabStats stats collects the per glyph solver counters. A pool
+    from MakePool is used instead of starting one for jobs != 1.
+    """
+    # glyph -> bitmap digest
+    pending = {}
+    # bitmap digest -> glyphs. Glyphs with identical bitmaps (e.g. "0"/"O"
+    # in some fonts) share one solution
+    shared = {}
+    for c, mask in masks.items():
+        bitmap = hashlib.sha1(np.packbits(mask).tobytes()).hexdigest()
+        pending[c] = bitmap
+        shared.setdefault(bitmap, []).append(c)
+    # every bitmap gets its own rng so a solution only depends on
+    # (seed, bitmap), not on `chars` or which glyph shares it
+    tasks = {bitmap: (MaskPoints(masks[chars[0]]), w, h, f"{seed}:{bitmap}",
+                      options, "".join(chars))
+             for bitmap, chars in shared.items()}
+    solved = dict(zip(tasks, SolveGlyphs(list(tasks.values()), jobs, pool)))
+    if stats is not None:
+        for c, bitmap in pending.items():
+            stats.glyphs[c] = solved[bitmap][1]
+    return {c: solved[bitmap][0] for c, bitmap in pending.items()}
 
-        # print(bitmap)
-        print(f"\nNew char: [{c}] ")
-        print(DumpSurface(txt))
-        patterns = CheckSurface(txt)
-        out[c] = SortPieces([(ll, all[index])
-                             for ll, index, all in patterns])
 
-    return (max_w, max_h), out
+# glyphs rendered and solved in one go by GlyphTiler.Tile
+TILE_CHUNK = 256
+# newly tiled glyphs after which GlyphTiler saves the cache
+SAVE_EVERY = 256
+
+
+class GlyphTiler:
+    """Tiles glyphs of one font through the tiling cache
+
+    Tile() may be called from several threads; rendering and cache access
+    are serialized, the solving itself is not. With jobs != 1 the glyphs
+    are solved in a process pool that is started up front, i.e. before the
+    caller starts any threads, and lives until Close().
+    """
+
+    def __init__(self, font, font_size, chars, seed=DEFAULT_SEED,
+                 cache_path=None, jobs=1, options=None, stats=None):
+        self.seed = seed
+        self.jobs = jobs
+        self.options = options if options is not None else SolverOptions()
+        self.stats = stats if stats is not None else FontTabStats()
+        self._font_size = font_size
+        self._variant = self.options.Variant()
+        self._lock = threading.Lock()
+        self._cache = None
+        if cache_path:
+            self._cache = TilingCache(cache_path)
+            self._font_digest = FontDigest(font)
+        self._unsaved = 0
+        self._font = ImageFont.truetype(font, font_size)
+        # empty if the cmap cannot be read, then every glyph is tiled
+        self._codepoints = FontCodepoints(font)
+        max_w = 0
+        max_h = 0
+        for c in set(chars):
+            if not self.HasGlyph(c):
+                continue
+            l, t, r, b = self._font.getbbox(c)
+            if r > max_w:
+                max_w = r
+            if b > max_h:
+                max_h = b
+        self.dim = (max_w, max_h)
+        logging.info(f"Dim: {max_w}x{max_h}")
+        self._pool = MakePool(jobs)
+
+    def _Key(self, c):
+        return TilingCache.Key(self._font_digest, self._font_size, self.seed,
+                               self._variant, c)
+
+    def HasGlyph(self, c):
+        return not self._codepoints or ord(c) in self._codepoints
+
+    def _Fits(self, c):
+        """False for glyphs outside the chars the cell was sized for that
+        do not fit into it, e.g. ones typed into the control channel"""
+        l, t, r, b = self._font.getbbox(c)
+        return r <= self.dim[0] and b <= self.dim[1]
+
+    def Tile(self, chars):
+        """Returns a glyph -> sorted (ll, piece) list map for chars
+
+        Chars the font has no glyph for are left out. New tilings are
+        saved to the cache every SAVE_EVERY glyphs so an interrupted run
+        of a large charset resumes where it stopped.
+        """
+        out = {}
+        todo = []
+        with self._lock:
+            for c in dict.fromkeys(chars):
+                if not self.HasGlyph(c):
+                    continue
+                # a cached tiling of a glyph that does not fit was made
+                # for a larger cell
+                if self._cache and self._Fits(c):
+                    patterns = self._cache.get(self._Key(c))
+                    if patterns is not None:
+                        out[c] = patterns
+                        self.stats.cached += 1
+                        continue
+                todo.append(c)
+        for i in range(0, len(todo), TILE_CHUNK):
+            out.update(self._TileChunk(todo[i:i + TILE_CHUNK]))
+        return out
+
+    def _TileChunk(self, todo):
+        out = {}
+        w, h = self.dim
+        with self._lock:
+            grays = RenderAtlas(self._font, todo, w, h)
+            pool = self._pool
+            clipped = {c for c in todo if not self._Fits(c)}
+        for c in clipped:
+            logging.warning(f"[{c}] is larger than the {w}x{h} cell - "
+                            "clipped")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for c, gray in zip(todo, grays):
+                logging.debug(f"New char: [{c}]\n{DumpGray(gray)}")
+        stats = FontTabStats()
+        # once the pool is closed the rare lookups are solved in process
+        tiled = TileGlyphs({c: gray == 0 for c, gray in zip(todo, grays)},
+                           w, h, self.seed, self.jobs if pool else 1,
+                           self.options, stats, pool)
+        with self._lock:
+            self.stats.glyphs.update(stats.glyphs)
+            for c, patterns in tiled.items():
+                out[c] = patterns
+                # best effort tilings are recomputed next time. Tilings
+                # from a worker are pickled, so the fillers are counted
+                # there rather than looked for by FILLER_PIECE identity.
+                # Clipped ones are not cached either, the key has no cell
+                if (self._cache and not stats.glyphs[c].fillers and
+                        c not in clipped):
+                    self._cache.put(self._Key(c), patterns)
+                    self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._cache.save()
+                self._unsaved = 0
+        return out
+
+    def Save(self):
+        if self._cache:
+            with self._lock:
+                self._cache.save()
+                self._unsaved = 0
+
+    def Close(self):
+        """Shuts the process pool down, Tile() then solves in process"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+class LazyFontTab(dict):
+    """A font tab whose glyphs are tiled on first access
+
+    WarmUp() tiles more glyphs in a background thread. Looking up a glyph
+    that is not tiled yet tiles it right away in the calling thread.
+    Iterating over the tab only sees the glyphs tiled so far.
+    """
+
+    def __init__(self, tiler: GlyphTiler):
+        super().__init__()
+        self._tiler = tiler
+        self._thread = None
+
+    def __missing__(self, c):
+        patterns = self.setdefault(c, self._tiler.Tile([c])[c])
+        if not self.Busy():
+            self._tiler.Save()
+        return patterns
+
+    def Busy(self):
+        """True while the background warm-up is running"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def WarmUp(self, chars):
+        todo = [c for c in dict.fromkeys(chars) if c not in self]
+        if not todo:
+            self._tiler.Close()
+            return
+        self._thread = threading.Thread(target=self._WarmUp, args=(todo,),
+                                        name="font-tab-warm-up", daemon=True)
+        self._thread.start()
+
+    def _WarmUp(self, todo):
+        start = time.monotonic()
+        # one glyph at a time unless a process pool does the work, so that
+        # lookups in the meantime rarely tile a glyph twice
+        chunk = 1 if self._tiler.jobs == 1 else 4 * (
+            self._tiler.jobs or os.cpu_count())
+        for i in range(0, len(todo), chunk):
+            for c, patterns in self._tiler.Tile(
+                    [c for c in todo[i:i + chunk] if c not in self]).items():
+                self.setdefault(c, patterns)
+        self._tiler.Save()
+        self._tiler.Close()
+        seconds = time.monotonic() - start
+        self._tiler.stats.seconds += seconds
+        logging.info(f"warm-up of {len(todo)} glyphs done in {seconds:.3f}s")
+        self._tiler.stats.Log()
+
+    def Wait(self, timeout=None):
+        """Waits for the background warm-up to finish"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def MakeFontTab(font, font_size, chars, seed=DEFAULT_SEED, cache_path=None,
+                jobs=1, options=None, stats=None, first=None):
+    """Returns (w, h) and a glyph -> sorted (ll, piece) list map
+
+    With `first` only the glyphs in first are tiled before returning; the
+    result is a LazyFontTab tiling the rest of chars in the background.
+    The solver counters are logged and, if given, collected in the
+    FontTabStats stats.
+    """
+    start = time.monotonic()
+    # the cell also has to fit the glyphs of first
+    tiler = GlyphTiler(font, font_size,
+                       list(chars) + list(first if first is not None else ""),
+                       seed, cache_path, jobs, options, stats)
+    if first is None:
+        out = tiler.Tile(chars)
+        tiler.Close()
+    else:
+        out = LazyFontTab(tiler)
+        out.update(tiler.Tile(first))
+    tiler.Save()
+    tiler.stats.seconds = time.monotonic() - start
+    tiler.stats.Log()
+    if first is not None:
+        out.WarmUp(chars)
+    return tiler.dim, out
 
 
 def main():
@@ -317,7 +1634,24 @@ def main():
     parser.add_argument("--font_size", action="store",  type=int,
                         help="Font Size.",
                         default=16)
+    parser.add_argument("--seed", action="store",  type=int,
+                        help="Seed for the piece order of the tiling search.",
+                        default=DEFAULT_SEED)
+    AddTilingArgs(parser)
+    AddSolverArgs(parser)
+    parser.add_argument("--prebuild_cache", action="store_true",
+                        help="Tile all of --charset into the cache and exit.")
+    AddCharsetArgs(parser)
+    AddProfileArgs(parser)
     args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    if args.prebuild_cache:
+        Profiled(args, MakeFontTab, args.font_path, args.font_size,
+                 ParseCharset(args.charset, args.font_path),
+                 seed=args.seed, cache_path=args.cache_path,
+                 jobs=args.jobs, options=SolverOptionsFromArgs(args))
+        return
 
     font = ImageFont.truetype(args.font_path, args.font_size)
     l, t, r, b = font.getbbox(args.text)
@@ -326,7 +1660,9 @@ def main():
     draw.rectangle((0, 0) + (r, b),  fill=WHITE)
     draw.text((0, 0), args.text, font=font, fill=BLACK)
     print(DumpSurface(txt))
-    MakeFontTab(args.font_path, args.font_size, args.text)
+    Profiled(args, MakeFontTab, args.font_path, args.font_size, args.text,
+             seed=args.seed, cache_path=args.cache_path, jobs=args.jobs,
+             options=SolverOptionsFromArgs(args))
 
 if __name__ == '__main__':
     main()
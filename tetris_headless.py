@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+"""
+Renders the scroller without a display, e.g. to export it or to measure
+the rendering throughput
+
+./tetris_headless.py --text "Hello World!" --gif hello.gif --scale 4
+./tetris_headless.py --raw hello.rgb
+./tetris_headless.py --pipe "ffmpeg -f rawvideo -pix_fmt rgb24 -s 128x64 -r 30 -i - hello.mp4"
+./tetris_headless.py --bench
+"""
+import logging
+import shlex
+import subprocess
+import time
+
+from PIL import GifImagePlugin, Image
+
+import tetris_font
+import tetris_scroll
+import tetris_packed
+import tetris_animation
+
+
+def RenderFrames(lanes, fb, fps, num_frames):
+    """Yields the frame buffer pixels of num_frames consecutive frames"""
+    for i in range(num_frames):
+        fb.Clear()
+        for texts in lanes:
+            texts.Render(fb, round(i * tetris_scroll.TICKS_PER_SECOND / fps))
+        yield fb.pixels
+
+
+class GifWriter:
+    """Streams the frames into an animated GIF
+
+    Every frame is written as soon as it is rendered, with its own color
+    table, so only one frame is held in memory. A frame has far fewer
+    than 256 colors, the quantization keeps them exact.
+    """
+
+    def __init__(self, path, fps, scale):
+        self._fp = open(path, "wb")
+        self._duration = round(1000 / fps)
+        self._scale = scale
+        self._started = False
+
+    def Write(self, pixels):
+        image = Image.fromarray(pixels, "RGB")
+        if self._scale != 1:
+            image = image.resize((image.width * self._scale,
+                                  image.height * self._scale), Image.NEAREST)
+        frame = image.quantize(256)
+        if not self._started:
+            header, _ = GifImagePlugin.getheader(
+                frame, info={"loop": 0, "duration": self._duration})
+            self._fp.writelines(header)
+            self._started = True
+        self._fp.writelines(GifImagePlugin.getdata(
+            frame, duration=self._duration, include_color_table=True))
+
+    def Close(self):
+        if self._started:
+            # trailer
+            self._fp.write(b";")
+        self._fp.close()
+
+
+class RawWriter:
+    """Writes the frames as consecutive rgb24 images to a file or a pipe"""
+
+    def __init__(self, fp, proc=None):
+        self._fp = fp
+        self._proc = proc
+        self._broken = False
+
+    def Write(self, pixels):
+        if self._broken:
+            return
+        try:
+            self._fp.write(pixels.tobytes())
+        except BrokenPipeError:
+            # e.g. the encoder of --pipe failed, it has logged why
+            logging.error("the --pipe command exited early, not writing "
+                          "any more frames to it")
+            self._broken = True
+
+    def Close(self):
+        try:
+            self._fp.close()
+        except BrokenPipeError:
+            pass
+        if self._proc:
+            self._proc.wait()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--text", action="store",  type=str,
+                        help="Text.",
+                        default="Hello World!")
+    parser.add_argument("--font_path", action="store",  type=str,
+                        help="Font Path.",
+                        default=tetris_animation.ATARI_FONT)
+    parser.add_argument("--font_size", action="store",  type=int,
+                        help="Font Size.",
+                        default=tetris_animation.ATARI_SIZE)
+    tetris_font.AddTilingArgs(parser)
+    tetris_packed.AddFontTabArgs(parser)
+    tetris_font.AddSolverArgs(parser)
+    tetris_font.AddProfileArgs(parser)
+    tetris_scroll.AddMissingArgs(parser)
+    tetris_scroll.AddLaneArgs(parser, tetris_animation.PALETTES)
+    parser.add_argument("--width", action="store",  type=int,
+                        help="Frame width.",
+                        default=tetris_animation.SCREEN_W)
+    parser.add_argument("--height", action="store",  type=int,
+                        help="Frame height.",
+                        default=tetris_animation.SCREEN_H)
+    parser.add_argument("--palette", action="store",  type=str,
+                        help="Piece colors.",
+                        choices=sorted(tetris_animation.PALETTES),
+                        default="rainbow")
+    parser.add_argument("--fps", action="store",  type=float,
+                        help="Frame rate of the exported animation.",
+                        default=30.0)
+    parser.add_argument("--speed_x", action="store",  type=float,
+                        help="Scroll speed in pixels per second.",
+                        default=tetris_animation.SPEED_X)
+    parser.add_argument("--speed_y", action="store",  type=float,
+                        help="Falling speed of the pieces in pixels per second.",
+                        default=tetris_animation.SPEED_Y)
+    parser.add_argument("--seconds", action="store",  type=float,
+                        help="Length of the animation (default: until the "
+                        "text has scrolled off the screen).",
+                        default=None)
+    parser.add_argument("--gif", action="store",  type=str,
+                        help="Write an animated GIF.",
+                        default=None)
+    parser.add_argument("--scale", action="store",  type=int,
+                        help="GIF only: enlarge pixels by this factor.",
+                        default=1)
+    parser.add_argument("--raw", action="store",  type=str,
+                        help="Write raw rgb24 frames to this file.",
+                        default=None)
+    parser.add_argument("--pipe", action="store",  type=str,
+                        help="Pipe raw rgb24 frames into this command.",
+                        default=None)
+    parser.add_argument("--bench", action="store_true",
+                        help="Render as fast as possible without output.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    lane_texts = tetris_scroll.LaneTexts(args.text, args.lane_text, args.lanes)
+    if args.font_tab:
+        font_tab = tetris_packed.PackedFontTab.Load(args.font_tab)
+        dim = font_tab.dim
+    else:
+        chars = "".join(lane_texts)
+        if args.missing == "replace":
+            chars += tetris_scroll.REPLACEMENT_CHAR
+        dim, font_tab = tetris_font.Profiled(
+            args, tetris_font.MakeFontTab, args.font_path, args.font_size,
+            chars,
+            cache_path=args.cache_path, jobs=args.jobs,
+            options=tetris_font.SolverOptionsFromArgs(args))
+    lanes = tetris_scroll.MakeLanes(
+        font_tab, dim, tetris_animation.PALETTES[args.palette],
+        tetris_scroll.TicksPerPixel(args.speed_x),
+        tetris_scroll.TicksPerPixel(args.speed_y),
+        args.width, args.height, len(lane_texts), args.lines,
+        missing=args.missing)
+    tetris_scroll.ConfigureLanes(
+        lanes, args.lane_speed_x,
+        [tetris_animation.PALETTES[p] for p in args.lane_palette])
+    fb = tetris_scroll.FrameBuffer(args.width, args.height)
+    for texts, text in zip(lanes, lane_texts):
+        if text:
+            texts.Add(text)
+            # starts the message so that its duration is known
+            texts.Render(fb, 0)
+    seconds = args.seconds
+    if seconds is None:
+        seconds = max(texts.Duration()
+                      for texts in lanes) / tetris_scroll.TICKS_PER_SECOND
+    num_frames = int(seconds * args.fps)
+
+    writers = []
+    if args.gif:
+        writers.append(GifWriter(args.gif, args.fps, args.scale))
+    if args.raw:
+        writers.append(RawWriter(open(args.raw, "wb")))
+    if args.pipe:
+        proc = subprocess.Popen(shlex.split(args.pipe), stdin=subprocess.PIPE)
+        writers.append(RawWriter(proc.stdin, proc))
+    if not writers and not args.bench:
+        parser.error("need at least one of --gif, --raw, --pipe or --bench")
+
+    start = time.perf_counter()
+    for pixels in RenderFrames(lanes, fb, args.fps, num_frames):
+        for w in writers:
+            w.Write(pixels)
+    for w in writers:
+        w.Close()
+    elapsed = time.perf_counter() - start
+    print(f"{num_frames} frames of {args.width}x{args.height} in "
+          f"{elapsed:.3f}s: {num_frames / max(elapsed, 1e-9):.1f} fps")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+"""
+Compact font tab stored in a few flat arrays
+
+Instead of a dict of ((x, y), [(dx, dy), ...]) lists a PackedFontTab keeps
+
+codepoints  u32[glyphs]       sorted code points of the glyphs
+start       u32[glyphs + 1]   index of the first piece of every glyph
+x, y        i16[pieces]       lower left of every piece
+kind        u8[pieces]        index into the piece table
+kind_start  u32[kinds + 1]    index of the first cell of every piece kind
+dx, dy      i8[cells]         cell offsets of the piece kinds
+
+The pieces of a glyph are stored in fall order (see SortPieces). The
+piece table is TETRIS_PIECES followed by FILLER_PIECE.
+
+The file starts with a header (magic, version, glyph width and height and
+the array lengths, all little endian u32) followed by the arrays in the
+order above, each aligned to 8 bytes, so Load() can map the file and use
+the arrays in place.
+
+./tetris_packed.py --font_path ./AtariST8x16SystemFont.ttf --font_size 16 atari16.tft
+"""
+import collections.abc
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import tetris_font
+
+MAGIC = b"TSFT"
+PACK_VERSION = 1
+# magic, version, w, h, glyphs, pieces, kinds, cells
+HEADER = struct.Struct("<4s7I")
+
+PIECE_KINDS = tetris_font.TETRIS_PIECES + [tetris_font.FILLER_PIECE]
+
+
+def _Sections(num_glyphs, num_pieces, num_kinds, num_cells):
+    """The (name, dtype, length) of the arrays in file order"""
+    return [("codepoints", "<u4", num_glyphs),
+            ("start", "<u4", num_glyphs + 1),
+            ("x", "<i2", num_pieces),
+            ("y", "<i2", num_pieces),
+            ("kind", "u1", num_pieces),
+            ("kind_start", "<u4", num_kinds + 1),
+            ("dx", "i1", num_cells),
+            ("dy", "i1", num_cells)]
+
+
+def _Align(offset):
+    return (offset + 7) & ~7
+
+
+class PackedFontTab(collections.abc.Mapping):
+    """A read-only glyph -> sorted (ll, piece) list map backed by arrays
+
+    Lookups return the piece lists of TETRIS_PIECES/FILLER_PIECE
+    themselves (not copies), like a freshly solved font tab.
+    """
+
+    def __init__(self, dim, arrays, buffer=None):
+        self.dim = dim
+        self._codepoints = arrays["codepoints"]
+        self._start = arrays["start"]
+        self._x = arrays["x"]
+        self._y = arrays["y"]
+        self._kind = arrays["kind"]
+        kind_start = arrays["kind_start"]
+        dx = arrays["dx"]
+        dy = arrays["dy"]
+        # the piece table is tiny, resolve it to the shared piece lists once
+        self._pieces = []
+        for k in range(len(kind_start) - 1):
+            cells = list(zip(dx[kind_start[k]:kind_start[k + 1]].tolist(),
+                             dy[kind_start[k]:kind_start[k + 1]].tolist()))
+            self._pieces.append(next(
+                (p for p in PIECE_KINDS if p == cells), cells))
+        # keeps the mapped file alive
+        self._buffer = buffer
+
+    @staticmethod
+    def Pack(font_tab, dim) -> "PackedFontTab":
+        """Packs a glyph -> sorted (ll, piece) list map"""
+        chars = sorted(font_tab, key=ord)
+        start = [0]
+        xs, ys, kinds = [], [], []
+        for c in chars:
+            for (x, y), piece in font_tab[c]:
+                xs.append(x)
+                ys.append(y)
+                kinds.append(PIECE_KINDS.index(piece))
+            start.append(len(kinds))
+        kind_start = [0]
+        for piece in PIECE_KINDS:
+            kind_start.append(kind_start[-1] + len(piece))
+        arrays = {
+            "codepoints": np.array([ord(c) for c in chars], dtype="<u4"),
+            "start": np.array(start, dtype="<u4"),
+            "x": np.array(xs, dtype="<i2"),
+            "y": np.array(ys, dtype="<i2"),
+            "kind": np.array(kinds, dtype="u1"),
+            "kind_start": np.array(kind_start, dtype="<u4"),
+            "dx": np.array([dx for p in PIECE_KINDS for dx, _ in p], dtype="i1"),
+            "dy": np.array([dy for p in PIECE_KINDS for _, dy in p], dtype="i1"),
+        }
+        return PackedFontTab(tuple(dim), arrays)
+
+    @staticmethod
+    def Load(path) -> "PackedFontTab":
+        """Maps a file written by Save()"""
+        with open(path, "rb") as fp:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, w, h, *counts = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != PACK_VERSION:
+            raise ValueError(f"{path} is not a version {PACK_VERSION} "
+                             "packed font tab")
+        arrays = {}
+        offset = HEADER.size
+        for name, dtype, length in _Sections(*counts):
+            offset = _Align(offset)
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=length,
+                                         offset=offset)
+            offset += arrays[name].nbytes
+        return PackedFontTab((w, h), arrays, buffer)
+
+    def Save(self, path):
+        counts = (len(self._codepoints), len(self._x), len(self._pieces),
+                  sum(len(p) for p in self._pieces))
+        arrays = {"codepoints": self._codepoints, "start": self._start,
+                  "x": self._x, "y": self._y, "kind": self._kind}
+        arrays["kind_start"] = np.cumsum(
+            [0] + [len(p) for p in self._pieces]).astype("<u4")
+        arrays["dx"] = np.array([dx for p in self._pieces for dx, _ in p],
+                                dtype="i1")
+        arrays["dy"] = np.array([dy for p in self._pieces for _, dy in p],
+                                dtype="i1")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, PACK_VERSION, *self.dim, *counts))
+            for name, dtype, length in _Sections(*counts):
+                fp.write(b"\0" * (_Align(fp.tell()) - fp.tell()))
+                fp.write(np.ascontiguousarray(arrays[name], dtype=dtype)
+                         .tobytes())
+        os.replace(tmp, path)
+
+    def _Index(self, c):
+        if len(c) != 1:
+            return None
+        cp = ord(c)
+        n = int(np.searchsorted(self._codepoints, cp))
+        if n < len(self._codepoints) and self._codepoints[n] == cp:
+            return n
+        return None
+
+    def __getitem__(self, c):
+        n = self._Index(c)
+        if n is None:
+            raise KeyError(c)
+        s, e = int(self._start[n]), int(self._start[n + 1])
+        return [((x, y), self._pieces[k]) for x, y, k in
+                zip(self._x[s:e].tolist(), self._y[s:e].tolist(),
+                    self._kind[s:e].tolist())]
+
+    def __contains__(self, c):
+        return isinstance(c, str) and self._Index(c) is not None
+
+    def __iter__(self):
+        return (chr(cp) for cp in self._codepoints.tolist())
+
+    def __len__(self):
+        return len(self._codepoints)
+
+    def nbytes(self):
+        """Size of the arrays (not counting the small piece table)"""
+        return sum(a.nbytes for a in (self._codepoints, self._start,
+                                      self._x, self._y, self._kind))
+
+
+def AddFontTabArgs(parser):
+    parser.add_argument("--font_tab", action="store",  type=str,
+                        help="Packed font tab (see tetris_packed.py) to use "
+                        "instead of tiling the font.",
+                        default=None)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--font_path", action="store",  type=str,
+                        help="Font Path.",
+                        default="AtariST8x16SystemFont.ttf")
+    parser.add_argument("--font_size", action="store",  type=int,
+                        help="Font Size.",
+                        default=16)
+    tetris_font.AddCharsetArgs(parser)
+    parser.add_argument("--seed", action="store",  type=int,
+                        help="Seed for the piece order of the tiling search.",
+                        default=tetris_font.DEFAULT_SEED)
+    tetris_font.AddTilingArgs(parser)
+    tetris_font.AddSolverArgs(parser)
+    tetris_font.AddProfileArgs(parser)
+    parser.add_argument("output", help="Packed font tab to write.")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO)
+
+    dim, font_tab = tetris_font.Profiled(
+        args, tetris_font.MakeFontTab, args.font_path, args.font_size,
+        tetris_font.ParseCharset(args.charset, args.font_path), seed=args.seed,
+        cache_path=args.cache_path, jobs=args.jobs,
+        options=tetris_font.SolverOptionsFromArgs(args))
+    packed = PackedFontTab.Pack(font_tab, dim)
+    packed.Save(args.output)
+    logging.info(f"wrote {len(packed)} glyphs to {args.output} "
+                 f"({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
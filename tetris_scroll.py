@@ -0,0 +1,653 @@
+#!/usr/bin/python3
+"""
+Scrolling text animation shared by led_scroller.py and tetris_animation.py
+
+Characters scroll in from the right. While they do their tetris pieces
+drop in one after another and once a character reaches the landing zone
+on the left the pieces fall out again.
+"""
+import bisect
+import collections
+import time
+
+from typing import List, Tuple
+
+import numpy as np
+
+PIXEL = Tuple[int, int, Tuple]
+
+# vertical distance (in SPEED_Y steps) between consecutive pieces of a
+# glyph when falling in and when falling out
+FALL_IN_GAP = 48
+FALL_OUT_GAP = 32
+# a character starts falling in once it is FALL_IN_LOC characters from the
+# right edge and falls out once it is FALL_OUT_LOC characters from the
+# left edge, whatever the width of the screen
+FALL_IN_LOC = 1
+FALL_OUT_LOC = 4
+
+# resolution of the animation time t
+TICKS_PER_SECOND = 1000000
+
+# what to show for characters the font tab has no glyph for: the
+# REPLACEMENT_CHAR, a gap or raise KeyError
+MISSING_POLICIES = ["replace", "skip", "error"]
+REPLACEMENT_CHAR = "?"
+
+# compiled glyphs (with their sprites) kept per SpriteCache, about 6 KiB
+# each for an 8x16 font
+SPRITE_CACHE_SIZE = 512
+
+
+def TicksPerPixel(pixels_per_second) -> int:
+    """Converts a speed into the speed_x/speed_y unit of CompiledText"""
+    return max(1, round(TICKS_PER_SECOND / pixels_per_second))
+
+
+def LookupGlyph(font_tab, c, missing="error"):
+    """Returns the tiling of c, or None if a gap should be shown instead"""
+    if c == " ":
+        return None
+    try:
+        return font_tab[c]
+    except KeyError:
+        if missing == "error":
+            raise
+    if missing == "replace" and c != REPLACEMENT_CHAR:
+        return LookupGlyph(font_tab, REPLACEMENT_CHAR, "skip")
+    return None
+
+
+def AddMissingArgs(parser):
+    parser.add_argument("--missing", action="store",  type=str,
+                        help="What to show for characters without a glyph.",
+                        choices=MISSING_POLICIES, default=MISSING_POLICIES[0])
+
+
+class CompiledGlyph:
+    """The pieces of a glyph as flat pixel lists (relative to the glyph origin)"""
+
+    def __init__(self, patterns, colors, base_y):
+        # per piece: (offset added in phase 1, offset subtracted in phase 2,
+        #             [(x, y, color), ...])
+        self.pieces = []
+        for num, (ll, piece) in enumerate(patterns):
+            color = colors[num % len(colors)]
+            pixels = [(ll[0] + dx, ll[1] + dy + base_y, color)
+                      for dx, dy in piece]
+            self.pieces.append(
+                (FALL_IN_GAP * num - len(piece), FALL_OUT_GAP * num, pixels))
+        # the assembled glyph, i.e. all pieces at rest
+        self.assembled = [p for _, _, pixels in self.pieces for p in pixels]
+        # from this fall-in step on all pieces have landed
+        self.landed = max((d for d, _, _ in self.pieces), default=0)
+        # the assembled glyph as numpy (xs, ys, colors) for FrameBuffer.Blit
+        # and the fall-in/fall-out offsets of the piece each pixel belongs to
+        self.assembled_arrays = PixelArrays(self.assembled)
+        self.fall_in = np.array([d for d, _, pixels in self.pieces
+                                 for _ in pixels], dtype=np.int32)
+        self.fall_out = np.array([d for _, d, pixels in self.pieces
+                                  for _ in pixels], dtype=np.int32)
+        # per piece: the offsets (both ascending) and the index of its
+        # first pixel in the assembled arrays
+        self.piece_fall_in = [d for d, _, _ in self.pieces]
+        self.piece_fall_out = [d for _, d, _ in self.pieces]
+        self.piece_start = [0]
+        for _, _, pixels in self.pieces:
+            self.piece_start.append(self.piece_start[-1] + len(pixels))
+        # the rows the assembled glyph occupies
+        self.top = min((y for _, y, _ in self.assembled), default=0)
+        self.bottom = max((y for _, y, _ in self.assembled), default=0)
+        # the assembled glyph as a bitmap (rows top to bottom) and the mask
+        # of its lit pixels, so that it can be copied in one operation
+        xs, ys, colors = self.assembled_arrays
+        shape = (self.bottom - self.top + 1, int(xs.max(initial=-1)) + 1)
+        self.sprite = np.zeros(shape + (3,), dtype=np.uint8)
+        self.sprite_mask = np.zeros(shape, dtype=bool)
+        self.sprite[ys - self.top, xs] = colors
+        self.sprite_mask[ys - self.top, xs] = True
+
+
+class SpriteCache:
+    """LRU cache of CompiledGlyphs keyed by (glyph, colors, base_y)
+
+    Shared by the texts drawn with the same font tab, so that glyphs are
+    compiled once and not again for every message, repeat and palette
+    switch. At most max_size glyphs are kept.
+    """
+
+    def __init__(self, max_size=SPRITE_CACHE_SIZE):
+        self._max_size = max_size
+        self._glyphs = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def Get(self, c, patterns, colors, base_y) -> CompiledGlyph:
+        key = (c, tuple(tuple(color) for color in colors), base_y)
+        g = self._glyphs.get(key)
+        if g is not None:
+            self._glyphs.move_to_end(key)
+            self.hits += 1
+            return g
+        self.misses += 1
+        g = CompiledGlyph(patterns, colors, base_y)
+        self._glyphs[key] = g
+        if len(self._glyphs) > self._max_size:
+            self._glyphs.popitem(last=False)
+        return g
+
+    def __len__(self):
+        return len(self._glyphs)
+
+
+def PixelArrays(pixels: List[PIXEL]):
+    xs = np.array([x for x, _, _ in pixels], dtype=np.int32)
+    ys = np.array([y for _, y, _ in pixels], dtype=np.int32)
+    colors = np.array([color[:3] for _, _, color in pixels],
+                      dtype=np.uint8).reshape(-1, 3)
+    return xs, ys, colors
+
+
+class FrameBuffer:
+    """An RGB frame kept as a HxWx3 uint8 numpy array
+
+    Frames are assembled with vectorized writes and handed to the display
+    in a single call instead of one SetPixel/set_at per pixel.
+    """
+
+    def __init__(self, w, h, background=(0, 0, 0)):
+        self.w = w
+        self.h = h
+        # a prefilled frame is much faster to copy than broadcasting a color
+        self._background = np.empty((h, w, 3), dtype=np.uint8)
+        self._background[:] = background[:3]
+        self.pixels = self._background.copy()
+
+    def Clear(self):
+        np.copyto(self.pixels, self._background)
+
+    def Blit(self, xs, ys, colors):
+        """Sets pixels (xs[i], ys[i]) to colors[i], clipping to the frame"""
+        inside = (xs >= 0) & (xs < self.w) & (ys >= 0) & (ys < self.h)
+        if not inside.all():
+            xs, ys, colors = xs[inside], ys[inside], colors[inside]
+        self.pixels[ys, xs] = colors
+
+    def SetPixel(self, pos, color):
+        """set_pixel compatible callback"""
+        x, y = pos
+        if 0 <= x < self.w and 0 <= y < self.h:
+            self.pixels[y, x] = color[:3]
+
+    def ToImage(self):
+        from PIL import Image
+        return Image.fromarray(self.pixels, "RGB")
+
+    def PushToCanvas(self, canvas):
+        """Copies the frame onto an rgbmatrix canvas"""
+        canvas.SetImage(self.ToImage())
+
+    def PushToSurface(self, surface):
+        """Copies the frame onto a pygame surface of the same size"""
+        import pygame
+        pygame.surfarray.blit_array(surface, self.pixels.swapaxes(0, 1))
+
+
+class CompiledText:
+    """The animation of a text precomputed for per frame rendering
+
+    Frame(t) returns the flat list of (x, y, color) pixels lit at time t,
+    clipped to the screen.
+
+    Render(fb, t) keeps the pieces at rest baked into a background layer
+    in text coordinates. A piece is painted into the layer when it lands
+    and erased when it starts to fall out, so per frame only the visible
+    slice of the layer is copied and the pieces in flight are drawn.
+    """
+
+    def __init__(self, text, font_tab, font_w, colors, speed_x, speed_y,
+                 screen_w, screen_h, base_y, missing="error", sprites=None):
+        self._text = text
+        self._font_w = font_w
+        self._speed_x = speed_x
+        self._speed_y = speed_y
+        self._screen_w = screen_w
+        self._screen_h = screen_h
+        # characters left of this x coordinate fall out
+        self._land_x = font_w * FALL_OUT_LOC
+        if sprites is None:
+            sprites = SpriteCache()
+        compiled = {}
+        self._glyphs = []
+        for c in text:
+            if c not in compiled:
+                patterns = LookupGlyph(font_tab, c, missing)
+                compiled[c] = None if patterns is None else sprites.Get(
+                    c, patterns, colors, base_y)
+            self._glyphs.append(compiled[c])
+        # the background layer, allocated by the first Render()
+        self._layer = None
+        self._lit = None
+        self._layer_y = 0
+        # character index -> range of its pieces painted into the layer
+        self._baked = {}
+
+    def arrival_time(self, n, loc):
+        """Time at which the n-th character is `loc` characters from the right"""
+        return (loc + n) * self._font_w * self._speed_x
+
+    def fall_out_time(self, n):
+        """Time at which the n-th character reaches the landing zone"""
+        return (self._screen_w - self._land_x + n * self._font_w) * \
+            self._speed_x
+
+    def Duration(self):
+        """Time after which the whole text has scrolled off the screen"""
+        return (self._screen_w + (len(self._text) + 1) * self._font_w) * \
+            self._speed_x
+
+    def VisibleRange(self, t):
+        """Returns the offset_x and range of character indices visible at t"""
+        fw = self._font_w
+        offset_x = self._screen_w - t // self._speed_x
+        first = max(0, -((fw + offset_x) // fw))
+        last = min(len(self._text) - 1, (self._screen_w - offset_x) // fw)
+        return offset_x, range(first, last + 1)
+
+    def CharStates(self, t):
+        """Yields (n, glyph, x0, falling_in, step, settled) per visible
+        character
+
+        step is the progress of the fall-in (falling_in) or fall-out
+        animation, settled is True while all pieces of the glyph are at rest.
+        """
+        fw = self._font_w
+        offset_x, visible = self.VisibleRange(t)
+        for n in visible:
+            g = self._glyphs[n]
+            if g is None:
+                continue
+            x0 = offset_x + n * fw
+            if x0 > self._land_x:
+                step = (t - self.arrival_time(n, FALL_IN_LOC)) // self._speed_y
+                yield n, g, x0, True, step, step >= g.landed
+            else:
+                step = (t - self.fall_out_time(n)) // self._speed_y
+                yield n, g, x0, False, step, step <= 0
+
+    @staticmethod
+    def PieceOffsetY(falling_in, step, fall_in, fall_out):
+        if falling_in:
+            offset_y = step - fall_in
+            return 0 if offset_y > 0 else offset_y
+        offset_y = step - fall_out
+        return 0 if offset_y < 0 else offset_y
+
+    def Frame(self, t) -> List[PIXEL]:
+        out = []
+        w = self._screen_w
+        h = self._screen_h
+        fw = self._font_w
+        for _, g, x0, falling_in, step, settled in self.CharStates(t):
+            if settled:
+                if 0 <= x0 and x0 + fw <= w:
+                    out += [(x0 + x, y, color) for x, y, color in g.assembled]
+                else:
+                    out += [(x0 + x, y, color) for x, y, color in g.assembled
+                            if 0 <= x0 + x < w]
+                continue
+            for fall_in, fall_out, pixels in g.pieces:
+                offset_y = self.PieceOffsetY(falling_in, step, fall_in, fall_out)
+                for x, y, color in pixels:
+                    x += x0
+                    y += offset_y
+                    if 0 <= x < w and 0 <= y < h:
+                        out.append((x, y, color))
+        return out
+
+    def _MakeLayer(self):
+        """Allocates the layer, as high as the band the glyphs occupy"""
+        rows = [g.assembled_arrays[1] for g in self._glyphs
+                if g is not None and g.assembled]
+        y0 = min((int(ys.min()) for ys in rows), default=0)
+        y1 = max((int(ys.max()) + 1 for ys in rows), default=0)
+        self._layer_y = y0
+        width = len(self._glyphs) * self._font_w
+        self._layer = np.zeros((y1 - y0, width, 3), dtype=np.uint8)
+        self._lit = np.zeros((y1 - y0, width), dtype=bool)
+
+    def _Bake(self, n, g, rest):
+        """Makes the layer hold exactly the pieces in range rest of char n"""
+        old = self._baked.get(n, (0, 0))
+        self._baked[n] = rest
+        x = n * self._font_w
+        if old[0] == old[1] and rest == (0, len(g.pieces)):
+            # the whole glyph at once, e.g. after a palette change
+            h, w = g.sprite_mask.shape
+            y = g.top - self._layer_y
+            np.copyto(self._layer[y:y + h, x:x + w], g.sprite,
+                      where=g.sprite_mask[:, :, None])
+            self._lit[y:y + h, x:x + w] |= g.sprite_mask
+            return
+        if rest[0] == rest[1] and old == (0, len(g.pieces)):
+            self._lit[:, x:x + self._font_w] = False
+            return
+        px, py, pc = g.assembled_arrays
+        for i in range(min(old[0], rest[0]), max(old[1], rest[1])):
+            paint = rest[0] <= i < rest[1]
+            if paint == (old[0] <= i < old[1]):
+                continue
+            s, e = g.piece_start[i], g.piece_start[i + 1]
+            xs = px[s:e] + x
+            ys = py[s:e] - self._layer_y
+            if paint:
+                self._layer[ys, xs] = pc[s:e]
+            self._lit[ys, xs] = paint
+
+    def _BlitLayer(self, fb: FrameBuffer, offset_x):
+        """Copies the lit pixels of the visible slice of the layer"""
+        x0 = max(0, -offset_x)
+        x1 = min(self._lit.shape[1], fb.w - offset_x)
+        y0 = max(0, self._layer_y)
+        y1 = min(fb.h, self._layer_y + self._lit.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return
+        ly0 = y0 - self._layer_y
+        ly1 = y1 - self._layer_y
+        np.copyto(fb.pixels[y0:y1, x0 + offset_x:x1 + offset_x],
+                  self._layer[ly0:ly1, x0:x1],
+                  where=self._lit[ly0:ly1, x0:x1, None])
+
+    def Render(self, fb: FrameBuffer, t):
+        """Like Frame(t) but writes the pixels into a FrameBuffer in one go"""
+        if self._layer is None:
+            self._MakeLayer()
+        h = self._screen_h
+        baked = self._baked
+        # pieces falling out are drawn behind the pieces at rest, pieces
+        # falling in in front of them
+        behind = ([], [], [])
+        in_front = ([], [], [])
+        for n, g, x0, falling_in, step, _ in self.CharStates(t):
+            # pieces land in order and fall out in order, so the pieces at
+            # rest are a prefix (a suffix) of the pieces, followed (preceded)
+            # by the ones in flight. Pieces that are far enough from their
+            # place are off screen.
+            if falling_in:
+                first = bisect.bisect_right(g.piece_fall_in, step)
+                rest = (0, first)
+                last = bisect.bisect_right(g.piece_fall_in, step + g.bottom)
+            else:
+                last = bisect.bisect_left(g.piece_fall_out, step)
+                rest = (last, len(g.pieces))
+                first = bisect.bisect_right(g.piece_fall_out,
+                                            step - h + g.top)
+            if baked.get(n) != rest:
+                self._Bake(n, g, rest)
+            if first >= last:
+                continue
+            s, e = g.piece_start[first], g.piece_start[last]
+            px, py, pc = g.assembled_arrays
+            xs, ys, colors = in_front if falling_in else behind
+            xs.append(px[s:e] + x0)
+            colors.append(pc[s:e])
+            if falling_in:
+                ys.append(py[s:e] + (step - g.fall_in[s:e]))
+            else:
+                ys.append(py[s:e] + (step - g.fall_out[s:e]))
+        if behind[0]:
+            fb.Blit(*(np.concatenate(a) for a in behind))
+        self._BlitLayer(fb, self._screen_w - t // self._speed_x)
+        if in_front[0]:
+            fb.Blit(*(np.concatenate(a) for a in in_front))
+
+    def Draw(self, set_pixel, t):
+        for x, y, color in self.Frame(t):
+            set_pixel((x, y), color)
+
+
+class FrameScheduler:
+    """Maps wall clock time to animation time at a fixed frame rate
+
+    Next() sleeps until the next frame slot and returns the animation time
+    (in TICKS_PER_SECOND) of that slot. Slots that passed while the
+    previous frame was being rendered are skipped, so the animation speed
+    does not depend on the rendering speed.
+
+    The time between a Next() returning and the following call (i.e. the
+    render and display time of a frame) is kept for the last `window`
+    frames; Stats() summarizes it. If given, stats_hook is called with
+    Stats() every `report_every` seconds.
+    """
+
+    def __init__(self, fps, stats_hook=None, report_every=1.0, window=256,
+                 clock=time.monotonic, sleep=time.sleep):
+        self._period = 1.0 / fps
+        self._clock = clock
+        self._sleep = sleep
+        self._stats_hook = stats_hook
+        self._report_every = report_every
+        self._frame_times = collections.deque(maxlen=window)
+        self._start = None
+        self._slot = -1
+        self._frame_start = None
+        self._next_report = None
+        self.frames = 0
+        self.dropped = 0
+
+    def Next(self) -> int:
+        now = self._clock()
+        if self._start is None:
+            self._start = now
+            self._next_report = now + self._report_every
+        if self._frame_start is not None:
+            self._frame_times.append(now - self._frame_start)
+        slot = max(self._slot + 1,
+                   int((now - self._start) / self._period + 0.999999))
+        self.dropped += slot - self._slot - 1
+        due = self._start + slot * self._period
+        if due > now:
+            self._sleep(due - now)
+        self._slot = slot
+        self.frames += 1
+        self._frame_start = self._clock()
+        if self._stats_hook and self._frame_start >= self._next_report:
+            self._next_report += self._report_every
+            self._stats_hook(self.Stats())
+        return round(slot * self._period * TICKS_PER_SECOND)
+
+    def Stats(self):
+        """Rolling frame time percentiles (in ms) and frame counters"""
+        times = sorted(self._frame_times)
+
+        def percentile(p):
+            if not times:
+                return 0.0
+            return times[min(len(times) - 1, int(p * len(times)))] * 1000
+
+        return {"p50_ms": percentile(0.50),
+                "p99_ms": percentile(0.99),
+                "frames": self.frames,
+                "dropped": self.dropped}
+
+
+def PrintFrameStats(stats):
+    print(f"frame p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+          f"frames={stats['frames']} dropped={stats['dropped']}")
+
+
+def AddSchedulerArgs(parser, fps, speed_x, speed_y):
+    parser.add_argument("--fps", action="store",  type=float,
+                        help="Target frame rate.",
+                        default=fps)
+    parser.add_argument("--speed_x", action="store",  type=float,
+                        help="Scroll speed in pixels per second.",
+                        default=speed_x)
+    parser.add_argument("--speed_y", action="store",  type=float,
+                        help="Falling speed of the pieces in pixels per second.",
+                        default=speed_y)
+    parser.add_argument("--show_stats", action="store_true",
+                        help="Print frame time statistics every second.")
+
+
+def SchedulerFromArgs(args) -> FrameScheduler:
+    return FrameScheduler(args.fps,
+                          PrintFrameStats if args.show_stats else None)
+
+
+class TextQueue:
+    """Scrolls a queue of messages one after the other
+
+    A message starts once the previous one has scrolled off the screen.
+    With repeat the last message starts over while the queue is empty.
+    Speed changes take effect with the next message, color changes
+    immediately.
+
+    The lines of a message ("\n" separated) scroll in step on up to
+    `lines` rows that are line_h pixels apart, surplus lines are appended
+    to the last row.
+    """
+
+    def __init__(self, font_tab, font_w, colors, speed_x, speed_y,
+                 screen_w, screen_h, base_y, repeat=False, missing="error",
+                 lines=1, line_h=0, sprites=None):
+        self._font_tab = font_tab
+        self._font_w = font_w
+        self._colors = colors
+        self._speed_x = speed_x
+        self._speed_y = speed_y
+        self._screen_w = screen_w
+        self._screen_h = screen_h
+        self._base_y = base_y
+        self._repeat = repeat
+        self._missing = missing
+        self._lines = lines
+        self._line_h = line_h
+        self._sprites = SpriteCache() if sprites is None else sprites
+        self._pending = collections.deque()
+        self._text = None
+        # one CompiledText per row of the current message
+        self._anims = []
+        self._duration = 0
+        self._start = 0
+
+    def _Compile(self, text):
+        rows = text.split("\n")
+        if len(rows) > self._lines:
+            rows[self._lines - 1:] = [" ".join(rows[self._lines - 1:])]
+        self._anims = [
+            CompiledText(row, self._font_tab, self._font_w, self._colors,
+                         self._speed_x, self._speed_y, self._screen_w,
+                         self._screen_h, self._base_y + n * self._line_h,
+                         self._missing, self._sprites)
+            for n, row in enumerate(rows)]
+        self._duration = max(a.Duration() for a in self._anims)
+
+    def Add(self, text):
+        self._pending.append(text)
+
+    def Clear(self):
+        """Drops the pending messages, the current one scrolls to its end"""
+        self._pending.clear()
+
+    def SetColors(self, colors):
+        self._colors = colors
+        if self._anims:
+            # same timing, so the message continues where it is
+            self._Compile(self._text)
+
+    def SetSpeed(self, speed_x=None, speed_y=None):
+        if speed_x is not None:
+            self._speed_x = speed_x
+        if speed_y is not None:
+            self._speed_y = speed_y
+
+    def Duration(self):
+        """Ticks the current message takes to scroll off (0 if idle)"""
+        return self._duration if self._anims else 0
+
+    def _Advance(self, t):
+        if self._anims and t - self._start < self._duration:
+            return
+        if self._pending:
+            self._text = self._pending.popleft()
+        elif not self._repeat:
+            self._text = None
+        if self._text is None:
+            self._anims = []
+            return
+        self._Compile(self._text)
+        self._start = t
+
+    def Render(self, fb: FrameBuffer, t):
+        self._Advance(t)
+        for anim in self._anims:
+            anim.Render(fb, t - self._start)
+
+
+def StackRows(screen_h, font_h, rows):
+    """Returns the base_y of `rows` rows of text spread evenly over the screen"""
+    if rows * font_h > screen_h:
+        raise ValueError(f"{rows} rows of {font_h} pixels do not fit "
+                         f"{screen_h} pixels")
+    gap = (screen_h - rows * font_h) // (rows + 1)
+    return [gap + n * (font_h + gap) for n in range(rows)]
+
+
+def MakeLanes(font_tab, dim, colors, speed_x, speed_y, screen_w, screen_h,
+              lanes=1, lines=1, repeat=False, missing="error"):
+    """Returns `lanes` TextQueues of `lines` rows each stacked on the screen
+
+    The lanes scroll independently but share the font tab and its sprite
+    cache, and are rendered into the same FrameBuffer one after the other.
+    """
+    base_y = StackRows(screen_h, dim[1], lanes * lines)
+    line_h = base_y[1] - base_y[0] if len(base_y) > 1 else 0
+    sprites = SpriteCache()
+    return [TextQueue(font_tab, dim[0], colors, speed_x, speed_y, screen_w,
+                      screen_h, base_y[n * lines], repeat, missing, lines,
+                      line_h, sprites)
+            for n in range(lanes)]
+
+
+def LaneTexts(text, lane_text, lanes):
+    """Returns the initial text of every lane, "\\n" in a text breaks lines
+
+    The first lane shows text, the others the --lane_text values in
+    order; lanes without a text start empty.
+    """
+    texts = [text] + lane_text
+    texts += [""] * (lanes - len(texts))
+    return [t.replace("\\n", "\n") for t in texts[:max(lanes, 1)]]
+
+
+def ConfigureLanes(lanes, lane_speed_x=(), lane_colors=()):
+    """Gives the lanes after the first their own scroll speed (pixels per
+    second) and colors, in order like LaneTexts does with --lane_text
+
+    Lanes without a value keep the ones MakeLanes gave them.
+    """
+    for texts, speed_x in zip(lanes[1:], lane_speed_x):
+        texts.SetSpeed(speed_x=TicksPerPixel(speed_x))
+    for texts, colors in zip(lanes[1:], lane_colors):
+        texts.SetColors(colors)
+
+
+def AddLaneArgs(parser, palettes):
+    parser.add_argument("--lanes", action="store",  type=int,
+                        help="Independently scrolling lanes.",
+                        default=1)
+    parser.add_argument("--lines", action="store",  type=int,
+                        help="Rows per lane for messages with line breaks "
+                        "('\\n').",
+                        default=1)
+    parser.add_argument("--lane_text", action="append",  type=str,
+                        help="Text of the next lane (repeatable).",
+                        default=[])
+    parser.add_argument("--lane_speed_x", action="append",  type=float,
+                        help="Scroll speed of the next lane in pixels per "
+                        "second (repeatable, default --speed_x).",
+                        default=[])
+    parser.add_argument("--lane_palette", action="append",  type=str,
+                        help="Piece colors of the next lane (repeatable).",
+                        choices=sorted(palettes), default=[])